@@ -0,0 +1,51 @@
+import argparse
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from core import database, functions, migration
+
+# 只有以这些参数开头时才进入命令行，其余参数留给Qt
+COMMANDS = ("reindex", "migrate", "-h", "--help")
+
+
+def reindex(session_maker, workers: int) -> int:
+    session = session_maker()
+    start = time.perf_counter()
+    done = total = 0
+    for done, total in functions.reindex_keywords(session, workers=workers):
+        elapsed = time.perf_counter() - start
+        print(f"\r已更新 {done}/{total} 条，每秒 {done / elapsed if elapsed else 0:.0f} 条", end="", flush=True)
+    session.close()
+    print(f"\n关键字重建完成，共 {total} 条，用时 {time.perf_counter() - start:.1f} 秒")
+    return 0
+
+
+def migrate(engine, check: bool) -> int:
+    if not check:
+        start = time.perf_counter()
+        for ver, dsc, done, total in migration.migrate(engine):
+            print(f"\r[{ver}/{migration.LATEST}] {dsc} {done}/{total}", end="", flush=True)
+        print(f"\n迁移完成，用时 {time.perf_counter() - start:.1f} 秒")
+    if problems := migration.verify(engine):
+        print("\n".join(problems))
+        return 1
+    print(f"数据库版本{migration.LATEST}，检查通过")
+    return 0
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="TagPDF")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("reindex", help="重新生成全部关键字")
+    command.add_argument("-w", "--workers", type=int, default=functions.REINDEX_WORKERS)
+    command = commands.add_parser("migrate", help="升级数据库结构并检查")
+    command.add_argument("--check", action="store_true", help="只检查不升级")
+    args = parser.parse_args(argv)
+
+    match args.command:
+        case "reindex":
+            return reindex(sessionmaker(bind=database.create_database()), args.workers)
+        case "migrate":
+            return migrate(database.create_database(upgrade=False), args.check)
+    return 1
@@ -0,0 +1,84 @@
+import os
+import configparser
+
+from sqlalchemy import Engine, create_engine, event
+
+from core import functions, migration
+
+SETTINGS = "settings.ini"
+DEFAULTS = {
+    "database": {
+        "path": "pdf.db3",
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": "-65536",
+        "mmap_size": "268435456",
+        "temp_store": "MEMORY",
+        "busy_timeout": "5000",
+    },
+    # 清理未使用的发布和标签的延迟毫秒数，0为每次编辑后立即清理
+    "cleanup": {
+        "delay": "0",
+    },
+    # 导出方式：zip打包，mirror在导出文件夹中建立同样的目录结构，优先使用共享数据块或硬链接，不支持时再复制
+    # 导出压缩方式：stored直接存储，deflate试压后压缩，parallel多进程压缩；workers为0时按CPU数量自动设置；resumable为yes时记录导出日志，出错后可以续传；volume_size为每个分卷的MB数，0为不分卷；dedupe为yes时内容相同的PDF只导出一次
+    "export": {
+        "mode": "zip",
+        "compression": "stored",
+        "level": "6",
+        "workers": "0",
+        "resumable": "yes",
+        "volume_size": "0",
+        "dedupe": "no",
+    },
+}
+# 取值受限的PRAGMA，其余按整数处理
+CHOICES = {
+    "journal_mode": ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"),
+    "synchronous": ("OFF", "NORMAL", "FULL", "EXTRA"),
+    "temp_store": ("DEFAULT", "FILE", "MEMORY"),
+}
+PRAGMAS = ("busy_timeout", "journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store")
+
+
+def load_settings(path: str = SETTINGS) -> configparser.ConfigParser:
+    # 首次运行时写出默认配置，方便手动修改
+    config = configparser.ConfigParser()
+    config.read_dict(DEFAULTS)
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            config.write(f)
+    config.read(path, encoding="utf-8")
+    return config
+
+
+def pragmas(config: configparser.ConfigParser) -> dict[str, str | int]:
+    section = config["database"]
+    values: dict[str, str | int] = dict()
+    for pragma in PRAGMAS:
+        if pragma in CHOICES:
+            if (value := section[pragma].strip().upper()) not in CHOICES[pragma]:
+                raise ValueError(f"{SETTINGS}中{pragma}的取值必须是{'、'.join(CHOICES[pragma])}之一")
+            values[pragma] = value
+        else:
+            values[pragma] = section.getint(pragma)
+    return values
+
+
+def create_database(config: configparser.ConfigParser | None = None, upgrade: bool = True) -> Engine:
+    config = config or load_settings()
+    values = pragmas(config)
+    engine = create_engine(f"sqlite:///{config['database']['path']}", echo=False)
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record) -> None:
+        # 每个新连接都设置一次，WAL模式下读写互不阻塞，提交时也不必每次完整同步
+        cursor = dbapi_connection.cursor()
+        for pragma, value in values.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+        functions.register_sql_functions(dbapi_connection, connection_record)
+
+    if upgrade:
+        migration.upgrade(engine)
+    return engine
@@ -0,0 +1,682 @@
+import os
+import csv
+import contextlib
+import datetime
+import errno
+import itertools
+import json
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+import zlib
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+
+from sqlalchemy.orm import Session
+
+from core import functions
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+BLOCK = 1024 * 1024
+PROBE = 64 * 1024
+PROBE_RATIO = 0.97
+LEVEL = 6
+WORKERS = functions.PROCESS_WORKERS
+COMPRESSIONS = ("stored", "deflate", "parallel")
+JOURNAL = ".journal"
+# 多进程压缩后直接写入压缩数据时用到的ZipFile内部属性
+RAW_ATTRS = ("fp", "start_dir", "filelist", "NameToInfo", "_writecheck", "_didModify", "_writing")
+VOLUME_WORKERS = 4
+# 目录结束记录22字节，条目过多或目录位置超过4GB时另有ZIP64结束记录56字节和定位记录20字节
+END_RECORD = 22 + 56 + 20
+# ZIP64扩展字段：本地文件头中的两个大小，中央目录中的两个大小，中央目录中的条目位置
+ZIP64_LOCAL = 4 + 16
+ZIP64_CENTRAL = 4 + 16
+ZIP64_OFFSET = 4 + 8
+MODES = ("zip", "mirror")
+MIRROR_WORKERS = 16
+MIRROR_METHODS = ("reflink", "hardlink", "copy")
+# Linux的FICLONE，btrfs、xfs等文件系统可以让两个文件共享数据块
+FICLONE = 0x40049409
+# 目标文件夹不支持某种方式时返回的错误，此时改用下一种方式
+UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTTY, errno.ENOSYS}
+# 文件系统不允许建立硬链接时返回EPERM
+LINK_UNSUPPORTED = UNSUPPORTED | {errno.EPERM}
+
+
+def export_names(folder: str) -> tuple[str, str]:
+    stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    return os.path.join(folder, f"PDF_{stamp}.zip"), os.path.join(folder, f"INFO_{stamp}.csv")
+
+
+def plan_export(session: Session, paths: list[str]) -> tuple[list[tuple[str, str, int]], list[list]]:
+    # 按导出清单逐行生成压缩包中的条目(源路径, 包内路径, 大小)和csv行，找不到的文件跳过
+    # 同一年份下有同名文件时在文件名后加序号，不区分大小写
+    entries, infos = list(), list()
+    used: set[str] = set()
+    for pos, path, tit, num, pubs, rls in functions.iter_manifest(session, paths):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        infos.append([pos + 1, tit, num if num else " ", "、".join(pubs) if pubs else " ", rls if rls else " "])
+        name = os.path.basename(path)
+        arcname = f"{rls}/{name}" if rls else name
+        root, ext = os.path.splitext(arcname)
+        n = 1
+        while arcname.casefold() in used:
+            n += 1
+            arcname = f"{root} ({n}){ext}"
+        used.add(arcname.casefold())
+        entries.append((path, arcname, size))
+    return entries, infos
+
+
+def _dedupe(
+    entries: list[tuple[str, str, int]], infos: list[list], hashes: dict[str, str]
+) -> tuple[list[tuple[str, str, int]], list[list[list]]]:
+    # 内容相同的文件只保留第一个，csv每行末尾注明该PDF在压缩包中对应的文件
+    # 返回保留的条目和每个条目对应的全部csv行，重复文件的行跟随保留的条目进入同一个分卷
+    stored: dict[str, int] = dict()
+    kept, groups = list(), list()
+    for (path, arcname, size), info in zip(entries, infos):
+        if (fh := hashes.get(path)) and fh in stored:
+            index = stored[fh]
+            groups[index].append(info + [kept[index][1]])
+            continue
+        if fh:
+            stored[fh] = len(kept)
+        kept.append((path, arcname, size))
+        groups.append([info + [arcname]])
+    return kept, groups
+
+
+def write_csv(csv_path: str, infos: list[list], dedupe: bool = False) -> None:
+    with open(csv_path, "w", encoding="gbk", errors="replace") as csv_file:
+        csv_writer = csv.writer(csv_file, lineterminator="\n")
+        csv_writer.writerow(["序号", "标题", "文号", "发布单位", "发布日期"] + (["文件"] if dedupe else []))
+        csv_writer.writerows(infos)
+
+
+def _compressible(block: bytes) -> bool:
+    # 用最快的压缩级别试压开头一段，压缩率不足时直接存储
+    sample = block[:PROBE]
+    return bool(sample) and len(zlib.compress(sample, 1)) < len(sample) * PROBE_RATIO
+
+
+def _deflate(path: str, temp: str, level: int) -> tuple[int, int, int | None]:
+    # 进程池中执行，原始deflate流写入临时文件，返回(crc, 原始大小, 压缩后大小)，不值得压缩时压缩后大小为None
+    crc = size = 0
+    with open(path, "rb") as src:
+        block = src.read(BLOCK)
+        if not _compressible(block):
+            while block:
+                crc = zlib.crc32(block, crc)
+                size += len(block)
+                block = src.read(BLOCK)
+            return crc, size, None
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        with open(temp, "wb") as dst:
+            while block:
+                crc = zlib.crc32(block, crc)
+                size += len(block)
+                dst.write(compressor.compress(block))
+                block = src.read(BLOCK)
+            dst.write(compressor.flush())
+            return crc, size, dst.tell()
+
+
+def _raw_supported(zip_file: zipfile.ZipFile) -> bool:
+    return all(hasattr(zip_file, attr) for attr in RAW_ATTRS)
+
+
+def _write_raw(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo, src_path: str) -> Iterator[int]:
+    # 写入已经算好CRC和大小的数据，本地文件头和目录的维护方式与ZipFile.open的写入模式相同
+    # zipfile没有写入已压缩数据的公开接口，只能使用内部属性，写入期间同样占用_writing
+    if zip_file._writing:
+        raise ValueError("压缩包中已有正在写入的条目")
+    zip64 = info.file_size > zipfile.ZIP64_LIMIT or info.compress_size > zipfile.ZIP64_LIMIT
+    if not info.external_attr:
+        info.external_attr = 0o600 << 16
+    zip_file.fp.seek(zip_file.start_dir)
+    info.header_offset = zip_file.fp.tell()
+    zip_file._writecheck(info)
+    zip_file._didModify = True
+    zip_file._writing = True
+    try:
+        zip_file.fp.write(info.FileHeader(zip64))
+        with open(src_path, "rb") as src:
+            while block := src.read(BLOCK):
+                zip_file.fp.write(block)
+                yield len(block)
+        zip_file.filelist.append(info)
+        zip_file.NameToInfo[info.filename] = info
+        zip_file.start_dir = zip_file.fp.tell()
+    finally:
+        zip_file._writing = False
+
+
+def _stream_entries(
+    zip_file: zipfile.ZipFile, entries: list[tuple[str, str, int]], compression: str, level: int
+) -> Iterator[tuple[int, int]]:
+    # 在当前线程中逐块写入，返回(完成文件数, 写入字节数)的增量
+    for path, arcname, size in entries:
+        info = zipfile.ZipInfo.from_file(path, arcname)
+        with open(path, "rb") as src:
+            block = src.read(BLOCK)
+            if compression == "deflate" and _compressible(block):
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.compress_level = level
+            else:
+                info.compress_type = zipfile.ZIP_STORED
+            with zip_file.open(info, "w") as dst:
+                while block:
+                    dst.write(block)
+                    yield 0, len(block)
+                    block = src.read(BLOCK)
+        yield 1, 0
+
+
+def _parallel_entries(
+    zip_file: zipfile.ZipFile,
+    entries: list[tuple[str, str, int]],
+    level: int,
+    workers: int,
+    pool: ProcessPoolExecutor | None = None,
+) -> Iterator[tuple[int, int]]:
+    # 多进程压缩到临时文件，再按原顺序拼装进压缩包，同时在压缩的文件数不超过进程数的两倍
+    # 分卷导出时各分卷共用同一个进程池，这里只取消和等待自己提交的任务
+    folder = os.path.dirname(os.path.abspath(zip_file.filename or "."))
+    executor = pool or ProcessPoolExecutor(max_workers=workers)
+    pending: deque[tuple[tuple[str, str, int], str, Future]] = deque()
+    temps: list[str] = list()
+    queued = iter(entries)
+
+    def submit() -> None:
+        if entry := next(queued, None):
+            fd, temp = tempfile.mkstemp(suffix=".tmp", dir=folder)
+            os.close(fd)
+            temps.append(temp)
+            pending.append((entry, temp, executor.submit(_deflate, entry[0], temp, level)))
+
+    try:
+        for _ in range(workers * 2):
+            submit()
+        while pending:
+            (path, arcname, size), temp, future = pending.popleft()
+            crc, file_size, compress_size = future.result()
+            submit()
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.CRC, info.file_size = crc, file_size
+            if compress_size is None:
+                info.compress_type, info.compress_size = zipfile.ZIP_STORED, file_size
+                source = path
+            else:
+                info.compress_type, info.compress_size = zipfile.ZIP_DEFLATED, compress_size
+                source = temp
+            reported = written = 0
+            for length in _write_raw(zip_file, info, source):
+                # 按原始大小折算进度
+                written += length
+                scaled = written * size // info.compress_size
+                yield 0, scaled - reported
+                reported = scaled
+            os.remove(temp)
+            temps.remove(temp)
+            yield 1, size - reported
+    finally:
+        if pool:
+            for _, _, future in pending:
+                future.cancel()
+            wait([future for _, _, future in pending])
+        else:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for temp in temps:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+
+def _record(info: zipfile.ZipInfo, end: int) -> dict:
+    return {
+        "name": info.filename,
+        "time": info.date_time,
+        "attr": info.external_attr,
+        "type": info.compress_type,
+        "crc": info.CRC,
+        "size": info.file_size,
+        "csize": info.compress_size,
+        "offset": info.header_offset,
+        "end": end,
+    }
+
+
+def _zipinfo(record: dict) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(record["name"], tuple(record["time"]))
+    info.external_attr = record["attr"]
+    info.compress_type = record["type"]
+    info.CRC, info.file_size, info.compress_size = record["crc"], record["size"], record["csize"]
+    info.header_offset = record["offset"]
+    return info
+
+
+def _verify(fp, record: dict) -> bool:
+    # 读回本地文件头和数据，位置、长度和CRC都一致才认为该条目完整
+    fp.seek(record["offset"])
+    header = fp.read(30)
+    if len(header) != 30 or header[:4] != b"PK\x03\x04":
+        return False
+    start = record["offset"] + 30 + int.from_bytes(header[26:28], "little") + int.from_bytes(header[28:30], "little")
+    if start + record["csize"] != record["end"]:
+        return False
+    fp.seek(start)
+    decompressor = zlib.decompressobj(-15) if record["type"] == zipfile.ZIP_DEFLATED else None
+    crc, remaining = 0, record["csize"]
+    while remaining:
+        if not (block := fp.read(min(BLOCK, remaining))):
+            return False
+        remaining -= len(block)
+        crc = zlib.crc32(decompressor.decompress(block) if decompressor else block, crc)
+    if decompressor:
+        crc = zlib.crc32(decompressor.flush(), crc)
+    return crc == record["crc"]
+
+
+def _export(
+    job: dict, journal: str | None, done: list[zipfile.ZipInfo], end: int, pool: ProcessPoolExecutor | None = None
+) -> Iterator[tuple[int, int, int, int]]:
+    # 从第len(done)个条目开始写入，done为已经写好并校验过的条目，end为其后的位置
+    entries = job["entries"]
+    files, total = len(entries), sum(size for _, _, size in entries)
+    done_files, done_bytes = len(done), sum(size for _, _, size in entries[: len(done)])
+    yield done_files, files, done_bytes, total
+    try:
+        with open(job["zip"], "r+b" if done else "wb") as fp:
+            # 截掉最后一个完整条目之后的内容，包括上次关闭时写出的目录
+            fp.truncate(end)
+            fp.seek(end)
+            log = open(journal, "a" if done else "w", encoding="utf-8") if journal else None
+            with zipfile.ZipFile(fp, "w") as zip_file, contextlib.closing(log) if log else contextlib.nullcontext():
+                if log and not done:
+                    log.write(json.dumps(job, ensure_ascii=False) + "\n")
+                    log.flush()
+                for info in done:
+                    zip_file.filelist.append(info)
+                    zip_file.NameToInfo[info.filename] = info
+                remaining = entries[len(done) :]
+                if job["compression"] == "parallel" and _raw_supported(zip_file):
+                    progress = _parallel_entries(zip_file, remaining, job["level"], job["workers"], pool)
+                else:
+                    # 当前Python的zipfile缺少所需的内部属性时退回单线程压缩
+                    compression = "deflate" if job["compression"] == "parallel" else job["compression"]
+                    progress = _stream_entries(zip_file, remaining, compression, job["level"])
+                with contextlib.closing(progress):
+                    for file_count, byte_count in progress:
+                        done_files += file_count
+                        done_bytes += byte_count
+                        if log and file_count:
+                            log.write(json.dumps(_record(zip_file.filelist[-1], zip_file.start_dir), ensure_ascii=False) + "\n")
+                            log.flush()
+                        yield done_files, files, done_bytes, total
+        write_csv(job["csv"], job["infos"], job.get("dedupe", False))
+        if journal:
+            os.remove(journal)
+    except BaseException as e:
+        # 可续传时出错保留压缩包和日志，用户取消或不可续传时全部删除
+        if not journal or isinstance(e, GeneratorExit):
+            for output in (job["zip"], job["csv"], journal):
+                if output and os.path.exists(output):
+                    os.remove(output)
+        raise
+
+
+def _entry_size(arcname: str, size: int, compression: str, cap: int) -> int:
+    # 本地文件头30字节、中央目录46字节加两份文件名，ZipFile按1.05倍大小判断是否写ZIP64字段
+    # 分卷可能超过4GB时中央目录还要记录ZIP64的条目位置，压缩时按zlib最坏的膨胀估计
+    total = 30 + 46 + 2 * len(arcname.encode())
+    if size * 1.05 > zipfile.ZIP64_LIMIT:
+        total += ZIP64_LOCAL + ZIP64_CENTRAL
+    if cap > zipfile.ZIP64_LIMIT:
+        total += ZIP64_OFFSET
+    if compression != "stored":
+        size += (size >> 12) + (size >> 14) + (size >> 25) + 13
+    return total + size
+
+
+def plan_volumes(
+    entries: list[tuple[str, str, int]], infos: list[list], cap: int, compression: str = "stored"
+) -> list[tuple[list, list]]:
+    # 按年份文件夹整组装入分卷，一个年份放不下时才拆开，单个文件超过上限时独占一卷
+    # 每卷预留目录结束记录的大小
+    volumes: list[tuple[list, list]] = list()
+    size = END_RECORD
+    for _, group in itertools.groupby(zip(entries, infos), key=lambda pair: os.path.dirname(pair[0][1])):
+        group = [(entry, info, _entry_size(entry[1], entry[2], compression, cap)) for entry, info in group]
+        if not volumes or (size > END_RECORD and size + sum(cost for _, _, cost in group) > cap):
+            volumes.append((list(), list()))
+            size = END_RECORD
+        for entry, info, cost in group:
+            if size > END_RECORD and size + cost > cap:
+                volumes.append((list(), list()))
+                size = END_RECORD
+            volumes[-1][0].append(entry)
+            volumes[-1][1].append(info)
+            size += cost
+    return volumes
+
+
+def _volume_name(path: str, index: int) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}-{index:02d}{ext}"
+
+
+def _read_job(journal: str) -> tuple[dict, list[str]]:
+    with open(journal, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    job = json.loads(lines[0])
+    job["entries"] = [tuple(entry) for entry in job["entries"]]
+    return job, lines
+
+
+class VolumeStopped(Exception):
+    pass
+
+
+def _export_volumes(
+    jobs: list[dict], journals: list[str | None], exports: list[Iterator]
+) -> Iterator[tuple[int, int, int, int]]:
+    # 多个分卷在线程中同时写入，汇总各卷进度后返回
+    # 用户取消或不可续传时出错，删除本次的全部分卷；可续传时出错，其余分卷也停止并保留已写入的部分
+    progress = [(0, len(job["entries"]), 0, sum(size for _, _, size in job["entries"])) for job in jobs]
+    updates: queue.Queue = queue.Queue()
+    cancel, failed = threading.Event(), threading.Event()
+
+    def run(index: int, export: Iterator) -> None:
+        try:
+            if cancel.is_set() or failed.is_set():
+                return
+            for value in export:
+                if cancel.is_set():
+                    export.close()
+                    return
+                if failed.is_set():
+                    export.throw(VolumeStopped())
+                updates.put((index, value))
+        except VolumeStopped:
+            pass
+        except BaseException as e:
+            updates.put((index, e))
+        finally:
+            updates.put((index, None))
+
+    yield tuple(map(sum, zip(*progress)))
+    executor = ThreadPoolExecutor(max_workers=min(VOLUME_WORKERS, len(jobs)))
+    error: BaseException | None = None
+    try:
+        for index, export in enumerate(exports):
+            executor.submit(run, index, export)
+        running = len(exports)
+        while running:
+            index, value = updates.get()
+            if value is None:
+                running -= 1
+            elif isinstance(value, BaseException):
+                error = error or value
+                failed.set()
+            else:
+                progress[index] = value
+                yield tuple(map(sum, zip(*progress)))
+        if error:
+            raise error
+    except BaseException as e:
+        (cancel if isinstance(e, GeneratorExit) else failed).set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        if isinstance(e, GeneratorExit) or not all(journals):
+            for job, journal in zip(jobs, journals):
+                for output in (job["zip"], job["csv"], journal):
+                    if output and os.path.exists(output):
+                        os.remove(output)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
+@contextlib.contextmanager
+def _volume_pool(jobs: list[dict]) -> Iterator[ProcessPoolExecutor | None]:
+    if not any(job["compression"] == "parallel" for job in jobs):
+        yield None
+        return
+    pool = ProcessPoolExecutor(max_workers=jobs[0].get("pool", jobs[0]["workers"]))
+    try:
+        yield pool
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def zip_path(
+    paths: list[str],
+    zip_file_path: str,
+    csv_path: str,
+    session: Session,
+    compression: str = "stored",
+    level: int = LEVEL,
+    workers: int = WORKERS,
+    resumable: bool = False,
+    volume_size: int = 0,
+    dedupe: bool = False,
+) -> Iterator[tuple[int, int, int, int]]:
+    # 逐块写入压缩包，每块返回(已完成文件数, 文件总数, 已写字节数, 总字节数)
+    # 中途关闭生成器即取消导出，已写出的压缩包和csv会被删除
+    # 可续传时每完成一个条目就记入日志，出错后可以用resume_zip从最后一个完整条目继续
+    # volume_size大于0时按该大小拆分为多个分卷同时写入，每卷带有各自的csv
+    # dedupe为True时内容相同的PDF只写入一次
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"压缩方式必须是{'、'.join(COMPRESSIONS)}之一")
+    entries, infos = plan_export(session, paths)
+    if dedupe:
+        hashes = functions.duplicate_hashes(session, [(path, size) for path, _, size in entries])
+        entries, infos = _dedupe(entries, infos, hashes)
+    else:
+        infos = [[info] for info in infos]
+    job = {
+        "zip": zip_file_path,
+        "csv": csv_path,
+        "compression": compression,
+        "level": level,
+        "workers": workers,
+        "entries": entries,
+        "infos": [row for rows in infos for row in rows],
+        "dedupe": dedupe,
+    }
+    volumes = plan_volumes(entries, infos, volume_size, compression) if volume_size else list()
+    if len(volumes) < 2:
+        yield from _export(job, zip_file_path + JOURNAL if resumable else None, [], 0)
+        return
+    # 多进程压缩时各分卷共用一个进程池，进程总数不超过workers，每卷同时压缩的文件数按分卷数分摊
+    jobs = [
+        dict(
+            job,
+            zip=_volume_name(zip_file_path, i),
+            csv=_volume_name(csv_path, i),
+            workers=max(1, workers // min(VOLUME_WORKERS, len(volumes))),
+            pool=workers,
+            entries=e,
+            infos=[row for rows in n for row in rows],
+        )
+        for i, (e, n) in enumerate(volumes, 1)
+    ]
+    journals = [volume["zip"] + JOURNAL if resumable else None for volume in jobs]
+    for volume, journal in zip(jobs, journals):
+        # 先写出全部分卷的日志，出错时尚未开始的分卷也能续传
+        if journal:
+            with open(journal, "w", encoding="utf-8") as f:
+                f.write(json.dumps(volume, ensure_ascii=False) + "\n")
+    with _volume_pool(jobs) as pool:
+        exports = [_export(volume, journal, [], 0, pool) for volume, journal in zip(jobs, journals)]
+        yield from _export_volumes(jobs, journals, exports)
+
+
+def _export_key(name: str) -> str:
+    # 同一次导出的压缩包、csv和日志去掉前缀、分卷号和扩展名后相同
+    return re.sub(r"^(PDF|INFO)_|(-\d+)?\.(zip|csv)(" + re.escape(JOURNAL) + ")?$", "", name)
+
+
+def find_journals(folder: str) -> list[list[str]]:
+    # 按导出批次分组，同一次导出的各分卷的日志在同一组
+    groups: dict[str, list[str]] = dict()
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(JOURNAL):
+            groups.setdefault(_export_key(name), list()).append(os.path.join(folder, name))
+    return list(groups.values())
+
+
+def discard_journals(journals: list[str]) -> None:
+    # 放弃续传时删除该次导出的全部文件，包括已经完成的分卷
+    folder = os.path.dirname(journals[0])
+    key = _export_key(os.path.basename(journals[0]))
+    pattern = re.compile(rf"(PDF|INFO)_{re.escape(key)}(-\d+)?\.(zip|csv)({re.escape(JOURNAL)})?")
+    for name in os.listdir(folder):
+        if pattern.fullmatch(name):
+            os.remove(os.path.join(folder, name))
+
+
+def resume_zip(journal: str, pool: ProcessPoolExecutor | None = None) -> Iterator[tuple[int, int, int, int]]:
+    # 按日志逐个校验已写入的条目，从第一个不完整的条目开始继续写入
+    job, lines = _read_job(journal)
+    records = list()
+    for line in lines[1:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            break
+    done: list[zipfile.ZipInfo] = list()
+    end = 0
+    if os.path.exists(job["zip"]):
+        with open(job["zip"], "rb") as fp:
+            for record, (_, arcname, _) in zip(records, job["entries"]):
+                if record["name"] != arcname or not _verify(fp, record):
+                    break
+                done.append(_zipinfo(record))
+                end = record["end"]
+    if len(done) < len(records):
+        # 日志中校验失败的部分作废，重写日志
+        with open(journal, "w", encoding="utf-8") as f:
+            f.write(lines[0] + "\n")
+            f.writelines(line + "\n" for line in lines[1 : len(done) + 1])
+    yield from _export(job, journal, done, end, pool)
+
+
+def resume_volumes(journals: list[str]) -> Iterator[tuple[int, int, int, int]]:
+    # 同时续传同一次导出中未完成的各分卷，已完成的分卷没有日志，不再处理
+    if len(journals) == 1:
+        yield from resume_zip(journals[0])
+        return
+    jobs = [_read_job(journal)[0] for journal in journals]
+    with _volume_pool(jobs) as pool:
+        yield from _export_volumes(jobs, journals, [resume_zip(journal, pool) for journal in journals])
+
+
+def _reflink(src_path: str, dst_path: str) -> None:
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "不支持共享数据块", dst_path)
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(dst_path)
+            raise
+
+
+def _mirror_file(src_path: str, dst_path: str, methods: list[str]) -> None:
+    # 依次尝试共享数据块、硬链接和复制，某种方式不可用后其余文件不再尝试
+    for method in list(methods):
+        try:
+            if method == "reflink":
+                _reflink(src_path, dst_path)
+            elif method == "hardlink":
+                os.link(src_path, dst_path)
+            else:
+                shutil.copyfile(src_path, dst_path)
+            if method != "hardlink":
+                shutil.copystat(src_path, dst_path)
+            return
+        except OSError as e:
+            if method == "copy" or e.errno not in (LINK_UNSUPPORTED if method == "hardlink" else UNSUPPORTED):
+                raise
+            with contextlib.suppress(ValueError):
+                methods.remove(method)
+
+
+def mirror_path(
+    paths: list[str],
+    mirror_folder: str,
+    csv_path: str,
+    session: Session,
+    workers: int = MIRROR_WORKERS,
+    dedupe: bool = False,
+) -> Iterator[tuple[int, int, int, int]]:
+    # 不打包，按压缩包中的目录结构在导出文件夹中建立文件，返回值与zip_path相同
+    # 中途取消或出错时删除本次建立的文件夹，重新导出的代价很小，因此不记录日志
+    entries, infos = plan_export(session, paths)
+    if dedupe:
+        hashes = functions.duplicate_hashes(session, [(path, size) for path, _, size in entries])
+        entries, groups = _dedupe(entries, infos, hashes)
+        infos = [row for rows in groups for row in rows]
+    files, total = len(entries), sum(size for _, _, size in entries)
+    yield 0, files, 0, total
+    methods = list(MIRROR_METHODS)
+    # 文件夹已经存在时在这里出错，不进入下面的清理
+    os.makedirs(mirror_folder)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        targets = [os.path.join(mirror_folder, *arcname.split("/")) for _, arcname, _ in entries]
+        for folder in sorted({os.path.dirname(target) for target in targets}):
+            os.makedirs(folder, exist_ok=True)
+        futures = {
+            executor.submit(_mirror_file, path, target, methods): size
+            for (path, _, size), target in zip(entries, targets)
+        }
+        done_files = done_bytes = 0
+        for future in as_completed(futures):
+            future.result()
+            done_files += 1
+            done_bytes += futures[future]
+            yield done_files, files, done_bytes, total
+        write_csv(csv_path, infos, dedupe)
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(mirror_folder, ignore_errors=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
+def export_options(section) -> dict:
+    # 从settings.ini的[export]中读取导出选项
+    if (compression := section.get("compression", "stored").strip().lower()) not in COMPRESSIONS:
+        raise ValueError(f"settings.ini中compression的取值必须是{'、'.join(COMPRESSIONS)}之一")
+    if (mode := section.get("mode", "zip").strip().lower()) not in MODES:
+        raise ValueError(f"settings.ini中mode的取值必须是{'、'.join(MODES)}之一")
+    if not 0 <= (level := section.getint("level", LEVEL)) <= 9:
+        raise ValueError("settings.ini中level的取值必须是0到9之间的整数")
+    if (workers := section.getint("workers", 0)) < 0:
+        raise ValueError("settings.ini中workers的取值必须是不小于0的整数")
+    if (volume_size := section.getint("volume_size", 0)) < 0:
+        raise ValueError("settings.ini中volume_size的取值必须是不小于0的整数")
+    return {
+        "mode": mode,
+        "compression": compression,
+        "level": level,
+        "workers": workers or WORKERS,
+        "resumable": section.getboolean("resumable", True),
+        "volume_size": volume_size * 1024 * 1024,
+        "dedupe": section.getboolean("dedupe", False),
+    }
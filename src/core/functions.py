@@ -1,57 +1,391 @@
 import os
-import csv
-import datetime
-import zipfile
-
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
-from pypinyin import Style, pinyin
+import contextlib
+import functools
+import hashlib
+import queue
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, selectinload
+from pypinyin import Style, lazy_pinyin, pinyin
 from typing import Any
+from collections.abc import Callable, Iterator
 
 from core import model
 
+CHUNK = 500
+SCAN_WORKERS = 8
+HASH_BLOCK = 64 * 1024
+HASH_WORKERS = 4
+LOST_DAYS = 90
+KEYWORD_CACHE = 65536
+KEYWORD_BATCH = 1000
+REINDEX_CHUNK = 2000
+# 多进程任务默认的进程数，重建索引和并行压缩共用
+PROCESS_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+REINDEX_WORKERS = PROCESS_WORKERS
+
+_KEYWORDS: OrderedDict[str, str] = OrderedDict()
+# 需要发布和标签时一次性批量加载，避免逐个PDF懒加载
+PDF_LOADERS = (selectinload(model.PDF.pubs), selectinload(model.PDF.tags))
+SEP = "\x1f"
+
+
+@contextlib.contextmanager
+def unit_of_work(session: Session) -> Iterator[Session]:
+    # 一次用户操作只提交一次，可以嵌套，只有最外层负责提交或回滚
+    depth = session.info.get("unit_of_work", 0)
+    session.info["unit_of_work"] = depth + 1
+    try:
+        yield session
+        if not depth:
+            session.commit()
+    except BaseException:
+        if not depth:
+            session.rollback()
+        raise
+    finally:
+        session.info["unit_of_work"] = depth
+
+
+def _commit(session: Session) -> None:
+    # 处于unit_of_work中时只写入不提交，由外层统一提交
+    if session.info.get("unit_of_work"):
+        session.flush()
+    else:
+        session.commit()
 
-def scan_pdf(folder: str) -> list | None:
+
+def is_disk_root(folder: str) -> bool:
     disk_path = [chr(i) + ":/" for i in range(ord("A"), ord("Z") + 1)]
     disk_path.append("/")
-    if folder.upper() in disk_path:
+    return folder.upper() in disk_path
+
+
+def scan_dir(folder: str, index: dict[str, tuple[int, str, str]] | None = None) -> tuple[list[str], list[str], tuple | None]:
+    # 文件夹的修改时间与索引一致时直接复用索引中的文件列表，只需一次stat
+    try:
+        mtime = os.stat(folder).st_mtime_ns
+    except OSError:
+        return [], [], None
+    if index and (cached := index.get(folder)) and cached[0] == mtime:
+        pdfs = [f"{folder}/{name}" for name in cached[1].split("/") if name]
+        dirs = [f"{folder}/{name}" for name in cached[2].split("/") if name]
+        return pdfs, dirs, cached
+    # 直接使用DirEntry缓存的类型信息，避免对每个文件再做一次stat
+    pdf_names, dir_names = [], []
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dir_names.append(entry.name)
+                    elif entry.name.lower().endswith(".pdf") and entry.is_file():
+                        pdf_names.append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        return [], [], None
+    pdfs = [f"{folder}/{name}" for name in pdf_names]
+    dirs = [f"{folder}/{name}" for name in dir_names]
+    return pdfs, dirs, (mtime, "/".join(pdf_names), "/".join(dir_names))
+
+
+def iter_pdf(
+    folder: str,
+    workers: int = SCAN_WORKERS,
+    ordered: bool = False,
+    index: dict[str, tuple[int, str, str]] | None = None,
+) -> Iterator[tuple[str, list[str], tuple | None]]:
+    # 逐个文件夹产出扫描结果和索引条目，调用方可以随时停止迭代
+    # 子文件夹作为独立任务提交到线程池，空闲线程从共享队列中领取下一个文件夹
+    # ordered为True时按文件夹名称深度优先产出，结果顺序固定
+    folder = folder.replace("\\", "/").rstrip("/")
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="scan")
+    try:
+        if ordered:
+            stack: list[tuple[str, Future]] = [(folder, pool.submit(scan_dir, folder, index))]
+            while stack:
+                root, future = stack.pop()
+                pdfs, dirs, entry = future.result()
+                stack.extend((d, pool.submit(scan_dir, d, index)) for d in sorted(dirs, reverse=True))
+                yield root, sorted(pdfs), entry
+        else:
+            done: queue.Queue[tuple[str, Future]] = queue.Queue()
+
+            def submit(d: str) -> None:
+                pool.submit(scan_dir, d, index).add_done_callback(lambda f: done.put((d, f)))
+
+            submit(folder)
+            pending = 1
+            while pending:
+                root, future = done.get()
+                pdfs, dirs, entry = future.result()
+                for d in dirs:
+                    submit(d)
+                pending += len(dirs) - 1
+                yield root, pdfs, entry
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def scan_pdf(folder: str) -> list | None:
+    if is_disk_root(folder):
         return None
+    return [path for root, paths, entry in iter_pdf(folder) for path in paths]
+
+
+def load_scan_index(session: Session, folder: str) -> dict[str, tuple[int, str, str]]:
+    query = session.query(model.DIR.dp, model.DIR.mt, model.DIR.fs, model.DIR.ds).filter(
+        or_(model.DIR.dp == folder, model.DIR.dp.startswith(f"{folder}/", autoescape=True))
+    )
+    return {dp: (mt, fs, ds) for dp, mt, fs, ds in query}
+
+
+def _names(names: str) -> set[str]:
+    return {name for name in names.split("/") if name}
+
+
+def rescan_dirs(
+    index: dict[str, tuple[int, str, str]], dirs: list[str], roots: list[str] | None = None
+) -> dict[str, tuple[int, str, str]]:
+    # roots整体按索引增量扫描，dirs只重新列出自身，新出现的子文件夹再递归扫描
+    entries = dict()
+    for root in roots or []:
+        entries.update((r, e) for r, p, e in iter_pdf(root, index=index) if e)
+    for folder in dirs:
+        if entry := scan_dir(folder)[2]:
+            entries[folder] = entry
+    for folder, entry in list(entries.items()):
+        old = index.get(folder)
+        for name in _names(entry[2]) - (_names(old[2]) if old else set()):
+            if (child := f"{folder}/{name}") not in entries:
+                entries.update((r, e) for r, p, e in iter_pdf(child, index=index) if e)
+    return entries
+
+
+def update_scan_index(
+    session: Session, index: dict[str, tuple[int, str, str]], entries: dict[str, tuple[int, str, str]]
+) -> tuple[list[str], list[str], list[str], list[str]]:
+    # 比较新旧条目并写入数据库，返回新增PDF、删除PDF、新增文件夹、删除文件夹
+    # 文件夹只有在上级文件夹的列表中消失时才视为删除，无法访问的文件夹保留原索引
+    changed = {dp: e for dp, e in entries.items() if index.get(dp) != e}
+    added, removed, gone = [], [], []
+    for dp, entry in changed.items():
+        old = index.get(dp)
+        old_pdfs = _names(old[1]) if old else set()
+        new_pdfs = _names(entry[1])
+        added.extend(f"{dp}/{name}" for name in sorted(new_pdfs - old_pdfs))
+        removed.extend(f"{dp}/{name}" for name in sorted(old_pdfs - new_pdfs))
+        if not old:
+            continue
+        for name in _names(old[2]) - _names(entry[2]):
+            child = f"{dp}/{name}"
+            gone.extend(k for k in index if (k == child or k.startswith(f"{child}/")) and k not in entries)
+    for dp in gone:
+        removed.extend(f"{dp}/{name}" for name in sorted(_names(index[dp][1])))
+    created = [dp for dp in changed if dp not in index]
+
+    rows = [{"dp": dp, "mt": e[0], "fs": e[1], "ds": e[2]} for dp, e in changed.items()]
+    for i in range(0, len(rows), CHUNK):
+        stmt = sqlite_insert(model.DIR).values(rows[i : i + CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[model.DIR.dp],
+            set_={"mt": stmt.excluded.mt, "fs": stmt.excluded.fs, "ds": stmt.excluded.ds},
+        )
+        session.execute(stmt)
+    for i in range(0, len(gone), CHUNK):
+        session.query(model.DIR).filter(model.DIR.dp.in_(gone[i : i + CHUNK])).delete(synchronize_session=False)
+    session.commit()
+
+    index.update(changed)
+    for dp in gone:
+        index.pop(dp, None)
+    return added, removed, created, gone
+
+
+def partial_hash(path: str) -> tuple[int, str] | None:
+    # 大小加首尾各64K的哈希，足以区分绝大多数PDF，读取量与文件大小无关
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+            digest.update(f.read(HASH_BLOCK))
+            if size > HASH_BLOCK * 2:
+                f.seek(-HASH_BLOCK, os.SEEK_END)
+            digest.update(f.read(HASH_BLOCK))
+    except OSError:
+        return None
+    return size, digest.hexdigest()
+
+
+def full_hash(path: str) -> str | None:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=32)).hexdigest()
+    except OSError:
+        return None
+
+
+def fill_fingerprints(
+    session: Session, full: bool = False, workers: int = HASH_WORKERS, cancelled: Callable[[], bool] = lambda: False
+) -> int:
+    # 为缺少指纹的记录补算指纹，full为True时同时计算全文哈希
+    query = session.query(model.PDF.id, model.PDF.fp).filter(model.PDF.lt.is_(None))
+    query = query.filter(or_(model.PDF.ph.is_(None), model.PDF.fh.is_(None)) if full else model.PDF.ph.is_(None))
+    rows = query.all()
+
+    def fingerprint(row: tuple[int, str]) -> dict | None:
+        if not (partial := partial_hash(row[1])):
+            return None
+        info = {"id": row[0], "sz": partial[0], "ph": partial[1]}
+        if full:
+            info["fh"] = full_hash(row[1])
+        return info
+
+    count = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="hash") as pool:
+        for i in range(0, len(rows), CHUNK):
+            if cancelled():
+                break
+            if infos := [info for info in pool.map(fingerprint, rows[i : i + CHUNK]) if info]:
+                session.execute(update(model.PDF), infos)
+                session.commit()
+                count += len(infos)
+    return count
+
+
+def duplicate_hashes(session: Session, files: list[tuple[str, int]], workers: int = HASH_WORKERS) -> dict[str, str]:
+    # 找出内容可能相同的文件并返回其全文哈希：先按大小分组，再比较首尾哈希，两者都相同的才计算全文哈希
+    # 数据库中大小和首尾哈希都没有变化的记录直接使用保存的全文哈希，新算出的写回数据库
+    sizes = Counter(size for _, size in files)
+    candidates = [path for path, size in files if sizes[size] > 1]
+    cached: dict[str, tuple[int, int, str, str]] = dict()
+    for i in range(0, len(candidates), CHUNK):
+        query = select(model.PDF.fp, model.PDF.id, model.PDF.sz, model.PDF.ph, model.PDF.fh)
+        cached.update((fp, row) for fp, *row in session.execute(query.where(model.PDF.fp.in_(candidates[i : i + CHUNK]))))
+    hashes: dict[str, str] = dict()
+    infos = list()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="hash") as pool:
+        partials = dict(zip(candidates, pool.map(partial_hash, candidates)))
+        groups = Counter(partial for partial in partials.values() if partial)
+        pending = [path for path, partial in partials.items() if partial and groups[partial] > 1]
+
+        def digest(path: str) -> tuple[str | None, bool]:
+            if (row := cached.get(path)) and row[3] and (row[1], row[2]) == partials[path]:
+                return row[3], False
+            return full_hash(path), True
+
+        for path, (fh, fresh) in zip(pending, pool.map(digest, pending)):
+            if fh is None:
+                continue
+            hashes[path] = fh
+            if fresh and path in cached:
+                infos.append({"id": cached[path][0], "sz": partials[path][0], "ph": partials[path][1], "fh": fh})
+    for i in range(0, len(infos), CHUNK):
+        session.execute(update(model.PDF), infos[i : i + CHUNK])
+        session.commit()
+    return hashes
+
+
+def sync_pdf_paths(session: Session, added: list[str], removed: list[str]) -> dict[str, str]:
+    # 消失的PDF只标记为丢失并保留标签，新出现的PDF再与丢失的记录对账
+    for i in range(0, len(removed), CHUNK):
+        session.query(model.PDF).filter(model.PDF.fp.in_(removed[i : i + CHUNK]), model.PDF.lt.is_(None)).update(
+            {"lt": int(time.time())}, synchronize_session=False
+        )
+    session.commit()
+    return reconcile_pdf_paths(session, added)
+
+
+def reconcile_pdf_paths(session: Session, paths: list[str]) -> dict[str, str]:
+    # 先按原路径恢复丢失的记录，再按大小和部分哈希把丢失的记录批量绑定到新路径
+    lost = session.query(model.PDF.id, model.PDF.fp, model.PDF.sz, model.PDF.ph).filter(model.PDF.lt.isnot(None)).all()
+    if not lost or not paths:
+        return dict()
+    tracked = set()
+    for i in range(0, len(paths), CHUNK):
+        tracked.update(fp for (fp,) in session.query(model.PDF.fp).filter(model.PDF.fp.in_(paths[i : i + CHUNK])))
+    candidates: dict[int, list[tuple[int, str, str]]] = dict()
+    for pid, fp, sz, ph in lost:
+        if fp in tracked:
+            continue
+        if sz is not None and ph:
+            candidates.setdefault(sz, []).append((pid, fp, ph))
+
+    moved, infos = dict(), [{"id": pid, "lt": None} for pid, fp, sz, ph in lost if fp in tracked]
+    for path in paths:
+        if path in tracked or not candidates:
+            continue
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            continue
+        if size not in candidates or not (partial := partial_hash(path)):
+            continue
+        for row in candidates[size]:
+            if row[2] == partial[1]:
+                candidates[size].remove(row)
+                if not candidates[size]:
+                    candidates.pop(size)
+                moved[row[1]] = path
+                infos.append({"id": row[0], "fp": path, "lt": None})
+                break
+    for i in range(0, len(infos), CHUNK):
+        session.execute(update(model.PDF), infos[i : i + CHUNK])
+    session.commit()
+    return moved
+
+
+def purge_lost_pdf(session: Session, days: int = LOST_DAYS) -> None:
+    ids = session.query(model.PDF.id).filter(model.PDF.lt < int(time.time()) - days * 86400).scalar_subquery()
+    session.query(model.PDF_PUB).filter(model.PDF_PUB.pdf_id.in_(ids)).delete(synchronize_session=False)
+    session.query(model.PDF_TAG).filter(model.PDF_TAG.pdf_id.in_(ids)).delete(synchronize_session=False)
+    session.query(model.PDF).filter(model.PDF.lt < int(time.time()) - days * 86400).delete(synchronize_session=False)
+    _commit(session)
+
+
+def existing_paths(
+    session: Session, pdfs: list[model.PDF], roots: tuple[str, ...] = (), cancelled: Callable[[], bool] = lambda: False
+) -> list[str] | None:
+    # 监视中的路径直接信任数据库，其余逐个检查是否存在
+    # 找不到的PDF只标记为丢失，保留标签等待按指纹重新绑定路径
     paths = []
-    for root, dirs, files in os.walk(folder):
-        for file in files:
-            if file.lower().endswith(".pdf"):
-                paths.append(os.path.join(root, file).replace("\\", "/"))
+    for pdf in pdfs:
+        if cancelled():
+            session.rollback()
+            return None
+        if pdf.fp.startswith(roots):
+            if pdf.lt is None:
+                paths.append(pdf.fp)
+        elif os.path.exists(pdf.fp):
+            paths.append(pdf.fp)
+            if pdf.lt is not None:
+                pdf.lt = None
+        elif pdf.lt is None:
+            pdf.lt = int(time.time())
+    session.commit()
     return paths
 
 
-def zip_path(paths: list[str], folder: str, session: Session) -> None:
-    folder = os.path.join(folder, "PDF_" + datetime.datetime.now().strftime("%Y%m%d%H%M%S") + ".zip")
-    zip_file = zipfile.ZipFile(folder, "w", zipfile.ZIP_DEFLATED)
-    csv_path = folder.replace("PDF_", "INFO_").replace(".zip", ".csv")
-    csv_file = open(csv_path, "w", encoding="gbk")
-    csv_writer = csv.writer(csv_file, lineterminator="\n")
-    csv_writer.writerow(["序号", "标题", "文号", "发布单位", "发布日期"])
-    csv_infos = list()
-    for rid, path in enumerate(paths):
-        pdf: model.PDF | None = get_pdf_by_path(session, path)
-        if not pdf:
-            continue
-        info = [rid + 1, pdf.tit, pdf.num if pdf.num else " "]
-        if pdf.pubs:
-            info.append("、".join([p.pub for p in pdf.pubs]))
-        else:
-            info.append(" ")
-        info.append(pdf.rls if pdf.rls else " ")
-        csv_infos.append(info)
+def get_all_root(session: Session) -> list[str]:
+    return [i[0] for i in session.query(model.ROOT.dp).order_by(model.ROOT.dp)]
 
-        if pdf.rls:
-            zip_file.write(path, f"{pdf.rls}/{os.path.basename(path)}")
-        else:
-            zip_file.write(path, os.path.basename(path))
-    csv_infos.sort(key=lambda x: x[4])
-    [csv_writer.writerow(info) for info in csv_infos]
-    csv_file.close()
-    zip_file.close()
+
+def add_root(session: Session, folder: str) -> list[str]:
+    # 已被其他监视路径包含时不重复添加，包含的下级监视路径合并到新路径中
+    roots = get_all_root(session)
+    if any(folder == root or folder.startswith(f"{root}/") for root in roots):
+        return roots
+    session.query(model.ROOT).filter(model.ROOT.dp.startswith(f"{folder}/", autoescape=True)).delete(
+        synchronize_session=False
+    )
+    session.add(model.ROOT(dp=folder))
+    session.commit()
+    return get_all_root(session)
 
 
 def rename_pdfs(session: Session):
@@ -75,28 +409,211 @@ def rename_pdfs(session: Session):
                 return pdf.fp
 
 
-def gen_keywords(string: str) -> str:
-    normal = "".join([i[0] for i in pinyin(string, style=Style.NORMAL, heteronym=False)])
-    first = "".join([i[0] for i in pinyin(string, style=Style.FIRST_LETTER, heteronym=False)])
+def _syllables(string: str) -> list[str]:
+    # 汉字各得一个拼音，其他字符逐个原样保留，结果与输入逐字对应
+    return [i[0] for i in pinyin(string, style=Style.NORMAL, heteronym=False, errors=list)]
+
+
+def _join_keywords(string: str, syllables: list[str]) -> str:
+    # 首字母直接取自全拼，不再单独调用一次FIRST_LETTER
+    normal = "".join(syllables)
+    first = "".join([s[0] for s in syllables if s])
     return "|".join([string, normal, first]).lower()
 
 
+def _cache_keywords(string: str, keywords: str) -> str:
+    _KEYWORDS[string] = keywords
+    if len(_KEYWORDS) > KEYWORD_CACHE:
+        _KEYWORDS.popitem(last=False)
+    return keywords
+
+
+def gen_keywords(string: str) -> str:
+    if (keywords := _KEYWORDS.get(string)) is not None:
+        _KEYWORDS.move_to_end(string)
+        return keywords
+    return _cache_keywords(string, _join_keywords(string, _syllables(string)))
+
+
+def gen_keywords_batch(strings: list[str]) -> list[str]:
+    # 未缓存的字符串以换行拼接后一次转换，再按字符位置切回各自的拼音
+    todo = list(dict.fromkeys(s for s in strings if s not in _KEYWORDS))
+    for i in range(0, len(todo), KEYWORD_BATCH):
+        batch = todo[i : i + KEYWORD_BATCH]
+        syllables = _syllables("\n".join(batch))
+        if len(syllables) != sum(map(len, batch)) + len(batch) - 1:
+            for string in batch:
+                gen_keywords(string)
+            continue
+        pos = 0
+        for string in batch:
+            _cache_keywords(string, _join_keywords(string, syllables[pos : pos + len(string)]))
+            pos += len(string) + 1
+    return [gen_keywords(s) for s in strings]
+
+
+def gen_pdf_keywords(tit: str | None, num: str | None, rls: int | None) -> str:
+    fields = [tit or "", num or "", str(rls) if rls else ""]
+    return "|".join(gen_keywords(f) for f in fields if f.strip())
+
+
+def _pdf_keywords(rows: list[tuple[int, str, str, int]]) -> list[dict]:
+    # 进程池中执行，先批量转换全部字段，再逐行拼接
+    gen_keywords_batch([str(f) for row in rows for f in row[1:] if f])
+    return [{"id": i, "kw": gen_pdf_keywords(tit, num, rls)} for i, tit, num, rls in rows]
+
+
+def _name_keywords(rows: list[tuple[int, str]]) -> list[dict]:
+    return [{"id": i, "kw": kw} for (i, _), kw in zip(rows, gen_keywords_batch([name for _, name in rows]))]
+
+
+def reindex_keywords(
+    session: Session, workers: int = REINDEX_WORKERS, cancelled: Callable[[], bool] = lambda: False
+) -> Iterator[tuple[int, int]]:
+    # 多进程重新生成全部关键字，每批单独提交，逐批返回已完成数和总数
+    jobs = [
+        (model.PDF, _pdf_keywords, session.execute(select(model.PDF.id, model.PDF.tit, model.PDF.num, model.PDF.rls)).all()),
+        (model.PUB, _name_keywords, session.execute(select(model.PUB.id, model.PUB.pub)).all()),
+        (model.TAG, _name_keywords, session.execute(select(model.TAG.id, model.TAG.tag)).all()),
+    ]
+    total = sum(len(rows) for _, _, rows in jobs)
+    done = 0
+    yield done, total
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [
+            (table, executor.submit(job, [tuple(row) for row in rows[i : i + REINDEX_CHUNK]]))
+            for table, job, rows in jobs
+            for i in range(0, len(rows), REINDEX_CHUNK)
+        ]
+        for table, future in futures:
+            if cancelled():
+                break
+            values = future.result()
+            session.execute(update(table), values)
+            session.commit()
+            done += len(values)
+            yield done, total
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 def create_pdf_by_path(session: Session, path: str) -> model.PDF:
     pdf = model.PDF(fp=path)
+    if partial := partial_hash(path):
+        pdf.sz, pdf.ph = partial
     session.add(pdf)
-    session.commit()
+    _commit(session)
     return pdf
 
 
 def get_pdf_by_path(session: Session, path: str) -> model.PDF | None:
-    return session.query(model.PDF).filter(model.PDF.fp == path).one_or_none()
+    return session.query(model.PDF).options(*PDF_LOADERS).filter(model.PDF.fp == path).one_or_none()
+
+
+def _group_concat(name, link_table, link_column):
+    return (
+        select(func.group_concat(name, SEP))
+        .select_from(link_table)
+        .join(name.table, name.table.c.id == link_column)
+        .where(link_table.c.pdf_id == model.PDF.id)
+        .scalar_subquery()
+    )
+
+
+PDF_ROW = (
+    model.PDF.fp,
+    model.PDF.tit,
+    model.PDF.num,
+    _group_concat(model.PUB.pub, model.PDF_PUB.__table__, model.PDF_PUB.pub_id),
+    model.PDF.rls,
+    _group_concat(model.TAG.tag, model.PDF_TAG.__table__, model.PDF_TAG.tag_id),
+)
+
+
+def get_pdf_rows_by_paths(session: Session, paths: list[str]) -> dict[str, tuple]:
+    # 只取列不构造ORM对象，发布和标签在数据库中用group_concat聚合，返回{路径: (标题, 文号, 发布, 年份, 标签)}
+    rows = dict()
+    for i in range(0, len(paths), CHUNK):
+        query = session.execute(select(*PDF_ROW).where(model.PDF.fp.in_(paths[i : i + CHUNK])))
+        for fp, tit, num, pubs, rls, tags in query:
+            rows[fp] = (tit, num, pubs.split(SEP) if pubs else [], rls, tags.split(SEP) if tags else [])
+    return rows
+
+
+def get_pdf_info_by_paths(session: Session, paths: list[str]) -> dict[str, tuple[str, str]]:
+    # 分批用IN查询标题和文号，直接返回元组，不构造ORM对象
+    info = dict()
+    for i in range(0, len(paths), CHUNK):
+        query = session.query(model.PDF.fp, model.PDF.tit, model.PDF.num).filter(model.PDF.fp.in_(paths[i : i + CHUNK]))
+        info.update((fp, (tit, num)) for fp, tit, num in query)
+    return info
+
+
+@functools.cache
+def _char_pinyin(char: str) -> str:
+    return lazy_pinyin(char)[0] if "\u4e00" <= char <= "\u9fff" else char
+
+
+def pinyin_key(string: str | None) -> str | None:
+    # 供SQL排序使用的拼音排序键，逐字查表，汉字按拼音、其他字符按原样排序
+    if string is None:
+        return None
+    return "".join(map(_char_pinyin, string)).lower()
+
+
+def register_sql_functions(dbapi_connection, connection_record=None) -> None:
+    dbapi_connection.create_function("pinyin_key", 1, pinyin_key, deterministic=True)
+
+
+def _fill_listing(session: Session, paths: list[str]):
+    conn = session.connection()
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS listing (pos INTEGER PRIMARY KEY, fp TEXT, nm TEXT)")
+    conn.exec_driver_sql("DELETE FROM listing")
+    conn.exec_driver_sql(
+        "INSERT INTO listing (pos, fp, nm) VALUES (?, ?, ?)",
+        [(pos, path, path.rsplit("/", 1)[-1]) for pos, path in enumerate(paths)],
+    )
+    return conn
+
+
+def sort_paths(session: Session, paths: list[str], field: str, descending: bool = False) -> list[str]:
+    # 把当前列表写入临时表并与pdf表关联，由数据库按拼音排序，相同时保持原有顺序
+    keys = {"name": "listing.nm", "tit": "pdf.tit", "num": "pdf.num"}
+    direction = "DESC" if descending else "ASC"
+    conn = _fill_listing(session, paths)
+    rows = conn.exec_driver_sql(
+        f"SELECT listing.fp FROM listing LEFT JOIN pdf ON pdf.fp = listing.fp "
+        f"ORDER BY pinyin_key({keys[field]}) {direction}, {keys[field]} {direction}, listing.pos"
+    ).fetchall()
+    conn.exec_driver_sql("DELETE FROM listing")
+    session.commit()
+    return [fp for (fp,) in rows]
+
+
+def iter_manifest(session: Session, paths: list[str]) -> Iterator[tuple[int, str, str, str, list[str], int]]:
+    # 导出清单：一次关联查询取得标题、文号、发布和年份，按年份排序，没有年份的排在最后，同年份保持列表顺序
+    conn = _fill_listing(session, paths)
+    rows = conn.exec_driver_sql(
+        "SELECT listing.pos, listing.fp, pdf.tit, pdf.num, (SELECT group_concat(pub.pub, ?) FROM pdf_pub "
+        "JOIN pub ON pub.id = pdf_pub.pub_id WHERE pdf_pub.pdf_id = pdf.id), pdf.rls "
+        "FROM listing JOIN pdf ON pdf.fp = listing.fp ORDER BY pdf.rls IS NULL, pdf.rls, listing.pos",
+        (SEP,),
+    )
+    try:
+        for pos, fp, tit, num, pubs, rls in rows:
+            yield pos, fp, tit, num, pubs.split(SEP) if pubs else [], rls
+    finally:
+        rows.close()
+        conn.exec_driver_sql("DELETE FROM listing")
+        session.commit()
 
 
 def get_pub_by_pub(session: Session, pub: str) -> model.PUB:
     if not (p := session.query(model.PUB).filter(model.PUB.pub == pub).one_or_none()):
         p = model.PUB(pub=pub, kw=gen_keywords(pub))
         session.add(p)
-        session.commit()
+        _commit(session)
     return p
 
 
@@ -104,7 +621,7 @@ def get_tag_by_tag(session: Session, tag: str) -> model.TAG:
     if not (t := session.query(model.TAG).filter(model.TAG.tag == tag).one_or_none()):
         t = model.TAG(tag=tag, kw=gen_keywords(tag))
         session.add(t)
-        session.commit()
+        _commit(session)
     return t
 
 
@@ -122,26 +639,27 @@ def get_all_tag(session: Session) -> list:
 
 def get_pdf_by_filters(session: Session, pub: list, rls: list, tag: list) -> list:
     query = session.query(model.PDF)
+    # 用不相关子查询代替EXISTS，先按名称找到发布和标签，再经关联表索引取得pdf_id
     if pub:
-        query = query.filter(model.PDF.pubs.any(model.PUB.pub.in_(pub)))
+        pdf_ids = select(model.PDF_PUB.pdf_id).join(model.PUB, model.PUB.id == model.PDF_PUB.pub_id)
+        query = query.filter(model.PDF.id.in_(pdf_ids.where(model.PUB.pub.in_(pub))))
     if rls:
         query = query.filter(model.PDF.rls.in_(rls))
     if tag:
-        query = query.filter(model.PDF.tags.any(model.TAG.tag.in_(tag)))
+        pdf_ids = select(model.PDF_TAG.pdf_id).join(model.TAG, model.TAG.id == model.PDF_TAG.tag_id)
+        query = query.filter(model.PDF.id.in_(pdf_ids.where(model.TAG.tag.in_(tag))))
     return query.all()
 
 
 def get_pdf_by_keywords(session: Session, keywords: list[str]) -> list:
-    query = session.query(model.PDF)
+    # 三个字符以上的关键词直接命中trigram索引，更短的关键词在索引表上逐行查找
+    ids = select(model.pdf_fts.c.rowid)
     for keyword in keywords:
-        query = query.filter(
-            or_(
-                model.PDF.kw.like(f"%{keyword}%"),
-                model.PDF.pubs.any(model.PUB.kw.like(f"%{keyword}%")),
-                model.PDF.tags.any(model.TAG.kw.like(f"%{keyword}%")),
-            )
-        )
-    return query.all()
+        if len(keyword) >= 3:
+            ids = ids.where(model.pdf_fts.c.kw.like(f"%{keyword}%"))
+        else:
+            ids = ids.where(func.instr(model.pdf_fts.c.kw, keyword.lower()) > 0)
+    return session.query(model.PDF).filter(model.PDF.id.in_(ids)).all()
 
 
 def update_pdf_with_field(session: Session, pdf: model.PDF, field: str, data: Any, kw: str | None = None) -> None:
@@ -149,23 +667,22 @@ def update_pdf_with_field(session: Session, pdf: model.PDF, field: str, data: An
     if kw:
         pdf.kw = kw
     session.add(pdf)
-    session.commit()
+    _commit(session)
 
 
 def delete_pdf(session: Session, pdf: model.PDF) -> None:
     session.delete(pdf)
-    session.commit()
+    _commit(session)
 
 
 def clear_pub_if_unused(session: Session) -> None:
-    for pub in session.query(model.PUB).all():
-        if not pub.pdf:
-            session.delete(pub)
-    session.commit()
+    # 一条DELETE ... WHERE NOT EXISTS删除没有被引用的发布单位
+    used = select(model.PDF_PUB.id).where(model.PDF_PUB.pub_id == model.PUB.id).exists()
+    session.query(model.PUB).filter(~used).delete(synchronize_session="fetch")
+    _commit(session)
 
 
 def clear_tag_if_unused(session: Session) -> None:
-    for tag in session.query(model.TAG).all():
-        if not tag.pdf:
-            session.delete(tag)
-    session.commit()
+    used = select(model.PDF_TAG.id).where(model.PDF_TAG.tag_id == model.TAG.id).exists()
+    session.query(model.TAG).filter(~used).delete(synchronize_session="fetch")
+    _commit(session)
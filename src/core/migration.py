@@ -0,0 +1,131 @@
+import re
+import time
+from collections.abc import Callable, Iterator
+
+from sqlalchemy import Connection, Engine, func, insert, inspect, select, text
+
+from core import model
+
+BATCH = 5000
+
+
+def _baseline(conn: Connection) -> Iterator[tuple[int, int]]:
+    # 只建立缺失的表，已有的表保持不变
+    model.Base.metadata.create_all(conn)
+    conn.commit()
+    yield 1, 1
+
+
+def _columns(conn: Connection) -> Iterator[tuple[int, int]]:
+    missing = list()
+    for table in model.Base.metadata.sorted_tables:
+        columns = {c["name"] for c in inspect(conn).get_columns(table.name)}
+        missing.extend((table, column) for column in table.columns if column.name not in columns)
+    for done, (table, column) in enumerate(missing, 1):
+        column_type = column.type.compile(conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        conn.commit()
+        yield done, len(missing)
+    if not missing:
+        yield 0, 0
+
+
+def _fts(conn: Connection) -> Iterator[tuple[int, int]]:
+    # 按id分段重建，每段单独提交，避免一次写入过大的事务
+    total = conn.scalar(select(func.count()).select_from(model.PDF)) or 0
+    last = conn.scalar(select(func.max(model.PDF.id))) or 0
+    conn.execute(text("DELETE FROM pdf_fts"))
+    conn.commit()
+    done = 0
+    for low in range(0, last, BATCH):
+        result = conn.execute(
+            text(
+                f"INSERT INTO pdf_fts(rowid, kw) SELECT pdf.id, {model.FTS_KEYWORD} FROM pdf "
+                "WHERE pdf.id > :low AND pdf.id <= :high"
+            ),
+            {"low": low, "high": low + BATCH},
+        )
+        conn.commit()
+        done += result.rowcount
+        yield done, total
+    if not last:
+        yield 0, 0
+
+
+def _indexes(conn: Connection) -> Iterator[tuple[int, int]]:
+    missing = list()
+    for table in model.Base.metadata.sorted_tables:
+        indexes = {i["name"] for i in inspect(conn).get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in indexes)
+    for done, index in enumerate(missing, 1):
+        # 建立后更新统计信息供查询计划使用
+        index.create(conn)
+        conn.execute(text(f"ANALYZE {index.table.name}"))
+        conn.commit()
+        yield done, len(missing)
+    if not missing:
+        yield 0, 0
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], Iterator[tuple[int, int]]]]] = [
+    (1, "建立数据表", _baseline),
+    (2, "补充新增列", _columns),
+    (3, "重建全文索引", _fts),
+    (4, "补充查询索引", _indexes),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(model.VERSION.__tablename__):
+        return 0
+    return conn.scalar(select(func.max(model.VERSION.ver))) or 0
+
+
+def migrate(engine: Engine) -> Iterator[tuple[int, str, int, int]]:
+    # 按版本顺序执行尚未完成的迁移，逐批返回版本、说明、已完成数和总数
+    with engine.connect() as conn:
+        version = current_version(conn)
+        conn.commit()
+        if version > LATEST:
+            raise RuntimeError(f"数据库版本{version}高于程序支持的版本{LATEST}，请升级程序")
+        for ver, dsc, step in MIGRATIONS:
+            if ver <= version:
+                continue
+            for done, total in step(conn):
+                yield ver, dsc, done, total
+            conn.execute(insert(model.VERSION).values(ver=ver, dsc=dsc, at=int(time.time())))
+            conn.commit()
+
+
+def upgrade(engine: Engine) -> None:
+    for _ in migrate(engine):
+        pass
+
+
+def verify(engine: Engine) -> list[str]:
+    # 检查版本、表、列、索引、触发器和全文索引是否完整，并做一次快速完整性检查
+    problems = list()
+    with engine.connect() as conn:
+        if (version := current_version(conn)) != LATEST:
+            problems.append(f"数据库版本为{version}，应为{LATEST}")
+        tables = set(inspect(conn).get_table_names())
+        for table in model.Base.metadata.sorted_tables:
+            if table.name not in tables:
+                problems.append(f"缺少表{table.name}")
+                continue
+            columns = {c["name"] for c in inspect(conn).get_columns(table.name)}
+            problems.extend(f"缺少列{table.name}.{c.name}" for c in table.columns if c.name not in columns)
+            indexes = {i["name"] for i in inspect(conn).get_indexes(table.name)}
+            problems.extend(f"缺少索引{i.name}" for i in table.indexes if i.name not in indexes)
+        names = {n for (n,) in conn.execute(text("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"))}
+        for ddl in model.FTS_DDL:
+            if (match := re.search(r"IF NOT EXISTS (\w+)", ddl)) and match.group(1) not in names:
+                problems.append(f"缺少{match.group(1)}")
+        if "pdf_fts" in names:
+            fts = conn.scalar(text("SELECT count(*) FROM pdf_fts"))
+            if fts != (pdf := conn.scalar(select(func.count()).select_from(model.PDF))):
+                problems.append(f"全文索引有{fts}条，PDF有{pdf}条")
+        if (check := conn.scalar(text("PRAGMA quick_check"))) != "ok":
+            problems.append(f"完整性检查失败：{check}")
+    return problems
@@ -1,6 +1,6 @@
 import os
 
-from sqlalchemy import Integer, String, ForeignKeyConstraint, UniqueConstraint
+from sqlalchemy import DDL, Integer, String, Text, ForeignKeyConstraint, UniqueConstraint, column, event, table
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -14,8 +14,12 @@ class PDF(Base):  # PDF表
     fp: Mapped[str] = mapped_column(String(250), nullable=True, unique=True, comment="file path")
     tit: Mapped[str] = mapped_column(String(250), nullable=True, comment="title")
     num: Mapped[str] = mapped_column(String(250), nullable=True, comment="number")
-    rls: Mapped[int] = mapped_column(Integer, nullable=True, comment="release")
+    rls: Mapped[int] = mapped_column(Integer, nullable=True, index=True, comment="release")
     kw: Mapped[str] = mapped_column(String(250), nullable=True, comment="keyword")
+    sz: Mapped[int] = mapped_column(Integer, nullable=True, comment="file size")
+    ph: Mapped[str] = mapped_column(String(32), nullable=True, comment="partial hash")
+    fh: Mapped[str] = mapped_column(String(64), nullable=True, comment="full hash")
+    lt: Mapped[int] = mapped_column(Integer, nullable=True, comment="lost time")
 
     pubs: Mapped[list["PUB"]] = relationship("PUB", secondary="pdf_pub", back_populates="pdf", uselist=True)
     tags: Mapped[list["TAG"]] = relationship("TAG", secondary="pdf_tag", back_populates="pdf", uselist=True)
@@ -55,7 +59,7 @@ class PDF_TAG(Base):  # PDF_TAG表
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, comment="ID")
     pdf_id: Mapped[int] = mapped_column(Integer, nullable=False, comment="pdf ID")
-    tag_id: Mapped[int] = mapped_column(Integer, nullable=False, comment="tag ID")
+    tag_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True, comment="tag ID")
 
 
 class PUB(Base):
@@ -80,4 +84,78 @@ class PDF_PUB(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, comment="ID")
     pdf_id: Mapped[int] = mapped_column(Integer, nullable=False, comment="pdf ID")
-    pub_id: Mapped[int] = mapped_column(Integer, nullable=False, comment="publisher ID")
+    pub_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True, comment="publisher ID")
+
+
+class DIR(Base):  # 扫描索引表
+    __tablename__ = "dir"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, comment="ID")
+    dp: Mapped[str] = mapped_column(String(250), nullable=False, unique=True, comment="dir path")
+    mt: Mapped[int] = mapped_column(Integer, nullable=False, comment="modified time (ns)")
+    fs: Mapped[str] = mapped_column(Text, nullable=False, default="", comment="pdf names")
+    ds: Mapped[str] = mapped_column(Text, nullable=False, default="", comment="sub dir names")
+
+    def __repr__(self):
+        return f"<DIR({self.dp})>"
+
+
+class ROOT(Base):  # 监视路径表
+    __tablename__ = "root"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, comment="ID")
+    dp: Mapped[str] = mapped_column(String(250), nullable=False, unique=True, comment="dir path")
+
+    def __repr__(self):
+        return f"<ROOT({self.dp})>"
+
+
+class VERSION(Base):  # 数据库版本表，每完成一步迁移记录一行
+    __tablename__ = "schema_version"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, comment="ID")
+    ver: Mapped[int] = mapped_column(Integer, nullable=False, unique=True, comment="version")
+    dsc: Mapped[str] = mapped_column(String(250), nullable=True, comment="description")
+    at: Mapped[int] = mapped_column(Integer, nullable=False, comment="applied time")
+
+    def __repr__(self):
+        return f"<VERSION({self.ver})>"
+
+
+# 关键词全文索引表，使用trigram分词以支持任意子串匹配，由触发器与pdf、pub、tag表保持同步
+pdf_fts = table("pdf_fts", column("rowid", Integer), column("kw", String))
+
+FTS_KEYWORD = (
+    "coalesce(pdf.kw, '')"
+    " || '|' || coalesce((SELECT group_concat(pub.kw, '|') FROM pdf_pub JOIN pub ON pub.id = pdf_pub.pub_id"
+    " WHERE pdf_pub.pdf_id = pdf.id), '')"
+    " || '|' || coalesce((SELECT group_concat(tag.kw, '|') FROM pdf_tag JOIN tag ON tag.id = pdf_tag.tag_id"
+    " WHERE pdf_tag.pdf_id = pdf.id), '')"
+)
+
+
+def _fts_refresh(pdf_id: str) -> str:
+    return (
+        f"DELETE FROM pdf_fts WHERE rowid = {pdf_id}; "
+        f"INSERT INTO pdf_fts(rowid, kw) SELECT pdf.id, {FTS_KEYWORD} FROM pdf WHERE pdf.id = {pdf_id};"
+    )
+
+
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pdf_fts USING fts5(kw, tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS pdf_fts_pdf_ai AFTER INSERT ON pdf BEGIN {_fts_refresh('new.id')} END",
+    f"CREATE TRIGGER IF NOT EXISTS pdf_fts_pdf_au AFTER UPDATE OF kw ON pdf BEGIN {_fts_refresh('new.id')} END",
+    "CREATE TRIGGER IF NOT EXISTS pdf_fts_pdf_ad AFTER DELETE ON pdf BEGIN DELETE FROM pdf_fts WHERE rowid = old.id; END",
+    f"CREATE TRIGGER IF NOT EXISTS pdf_fts_pdf_pub_ai AFTER INSERT ON pdf_pub BEGIN {_fts_refresh('new.pdf_id')} END",
+    f"CREATE TRIGGER IF NOT EXISTS pdf_fts_pdf_pub_ad AFTER DELETE ON pdf_pub BEGIN {_fts_refresh('old.pdf_id')} END",
+    f"CREATE TRIGGER IF NOT EXISTS pdf_fts_pdf_tag_ai AFTER INSERT ON pdf_tag BEGIN {_fts_refresh('new.pdf_id')} END",
+    f"CREATE TRIGGER IF NOT EXISTS pdf_fts_pdf_tag_ad AFTER DELETE ON pdf_tag BEGIN {_fts_refresh('old.pdf_id')} END",
+    "CREATE TRIGGER IF NOT EXISTS pdf_fts_pub_au AFTER UPDATE OF kw ON pub BEGIN "
+    "DELETE FROM pdf_fts WHERE rowid IN (SELECT pdf_id FROM pdf_pub WHERE pub_id = new.id); "
+    f"INSERT INTO pdf_fts(rowid, kw) SELECT pdf.id, {FTS_KEYWORD} FROM pdf "
+    "WHERE pdf.id IN (SELECT pdf_id FROM pdf_pub WHERE pub_id = new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS pdf_fts_tag_au AFTER UPDATE OF kw ON tag BEGIN "
+    "DELETE FROM pdf_fts WHERE rowid IN (SELECT pdf_id FROM pdf_tag WHERE tag_id = new.id); "
+    f"INSERT INTO pdf_fts(rowid, kw) SELECT pdf.id, {FTS_KEYWORD} FROM pdf "
+    "WHERE pdf.id IN (SELECT pdf_id FROM pdf_tag WHERE tag_id = new.id); END",
+]
+
+for ddl in FTS_DDL:
+    event.listen(Base.metadata, "after_create", DDL(ddl))
@@ -1,12 +1,18 @@
+import multiprocessing
 import sys
 
 from PySide6 import QtCore, QtWidgets, QtGui
 from PySide6.QtCore import QFile, QIODeviceBase
 
+import cli
 from ui.main_window import MainWindow
 from res import *
 
 if __name__ == "__main__":
+    # 打包后进程池的子进程也从这里启动
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] in cli.COMMANDS:
+        sys.exit(cli.main(sys.argv[1:]))
     QtCore.QLoggingCategory.setFilterRules("qt.pdf.links.warning=false")
     app = QtWidgets.QApplication(sys.argv)
     app.styleHints().setColorScheme(QtCore.Qt.ColorScheme.Light)  # type: ignore[attr-defined]
@@ -1,4 +1,6 @@
+from .export_dialog import ExportDialog
 from .filter_frame import FilterFrame
+from .folder_watcher import FolderWatcher
 from .info_frame import InfoFrame
 from .path_frame import PathFrame
 from .preview_frame import PreviewFrame
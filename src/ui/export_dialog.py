@@ -0,0 +1,118 @@
+import os
+import time
+from collections.abc import Callable
+
+from PySide6 import QtWidgets, QtCore
+from sqlalchemy.orm import Session
+
+from core import exporter
+
+
+class ExportThread(QtCore.QThread):
+    progressChanged = QtCore.Signal(int, int, int, int, float)
+    exportFinished = QtCore.Signal(str)
+    exportFailed = QtCore.Signal(str)
+    INTERVAL = 0.1
+
+    def __init__(
+        self,
+        paths: list[str],
+        folder: str,
+        session_maker: Callable[[], Session],
+        options: dict,
+        journals: list[str] | None,
+    ):
+        super().__init__(parent=None)
+        self._paths = paths
+        self._folder = folder
+        self._session_maker = session_maker
+        self._options = options
+        self._journals = journals
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        last = 0.0
+        session = self._session_maker()
+        if self._journals:
+            # 续传多个分卷时提示导出文件夹
+            zip_file_path = self._journals[0].removesuffix(exporter.JOURNAL) if len(self._journals) == 1 else self._folder
+            exports = exporter.resume_volumes(self._journals)
+        else:
+            zip_file_path, csv_path = exporter.export_names(self._folder)
+            options = dict(self._options)
+            if options.pop("mode", "zip") == "mirror":
+                zip_file_path = zip_file_path.removesuffix(".zip")
+                exports = exporter.mirror_path(
+                    self._paths, zip_file_path, csv_path, session, dedupe=options.get("dedupe", False)
+                )
+            else:
+                exports = exporter.zip_path(self._paths, zip_file_path, csv_path, session, **options)
+        try:
+            for progress in exports:
+                if self.isInterruptionRequested():
+                    # 关闭生成器即取消，未完成的文件由生成器删除
+                    exports.close()
+                    break
+                if (now := time.perf_counter()) - last >= ExportThread.INTERVAL:
+                    last = now
+                    self.progressChanged.emit(*progress, now - start)
+            else:
+                self.exportFinished.emit(zip_file_path if os.path.exists(zip_file_path) else self._folder)
+        except OSError as e:
+            if os.path.isdir(self._folder) and exporter.find_journals(self._folder):
+                self.exportFailed.emit(f"{e}\n再次导出到同一文件夹时可以从中断处继续")
+            else:
+                self.exportFailed.emit(str(e))
+        except Exception as e:
+            # 数据库被锁定、导出日志损坏等错误也要提示，否则对话框会直接关闭
+            self.exportFailed.emit(f"{type(e).__name__}: {e}")
+        finally:
+            session.close()
+
+
+class ExportDialog(QtWidgets.QProgressDialog):
+    def __init__(
+        self,
+        paths: list[str],
+        folder: str,
+        session_maker: Callable[[], Session],
+        options: dict | None = None,
+        journals: list[str] | None = None,
+        parent=None,
+    ):
+        super().__init__("正在准备导出……", "停止", 0, 0, parent)
+        self.setWindowTitle("导出当前列表")
+        self.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        self.setMinimumDuration(0)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self._thread = ExportThread(paths, folder, session_maker, options or dict(), journals)
+        self._thread.progressChanged.connect(self._progress)
+        self._thread.exportFinished.connect(self._finished)
+        self._thread.exportFailed.connect(self._failed)
+        self._thread.finished.connect(self.accept)
+        self.canceled.connect(self._thread.requestInterruption)
+
+    def exec(self) -> int:
+        self._thread.start()
+        result = super().exec()
+        # 导出完成前对话框被关闭也视为取消
+        self._thread.requestInterruption()
+        self._thread.wait()
+        return result
+
+    def _progress(self, files_done: int, files: int, bytes_done: int, total: int, elapsed: float) -> None:
+        # 按字节计算进度，显示剩余时间
+        self.setMaximum(1000)
+        self.setValue(int(1000 * bytes_done / total) if total else 0)
+        eta = elapsed * (total - bytes_done) / bytes_done if bytes_done else 0
+        self.setLabelText(
+            f"已导出 {files_done}/{files} 个文件，{bytes_done / 1048576:.1f}/{total / 1048576:.1f} MB，"
+            f"每秒 {bytes_done / 1048576 / elapsed if elapsed else 0:.1f} MB，剩余约 {int(eta) // 60}分{int(eta) % 60}秒"
+        )
+
+    def _finished(self, path: str) -> None:
+        QtWidgets.QMessageBox.information(self, "导出完成", f"已导出到\n{path}")
+
+    def _failed(self, message: str) -> None:
+        QtWidgets.QMessageBox.critical(self, "错误", f"导出失败\n{message}")
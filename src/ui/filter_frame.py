@@ -1,5 +1,3 @@
-import os
-
 from PySide6 import QtWidgets, QtCore, QtGui
 
 from core import functions
@@ -150,12 +148,41 @@ class CheckGroup(QtWidgets.QGroupBox):
             check.deleteLater()
 
 
+class QueryThread(QtCore.QThread):
+    resultReady = QtCore.Signal(int, list)
+
+    def __init__(self, generation: int, keywords: list[str], filters: tuple, roots: tuple, session_maker):
+        super().__init__(parent=None)
+        self._generation = generation
+        self._keywords = keywords
+        self._filters = filters
+        self._roots = roots
+        self._session_maker = session_maker
+
+    def run(self) -> None:
+        session = self._session_maker()
+        if self._keywords:
+            pdfs = functions.get_pdf_by_keywords(session, self._keywords)
+        else:
+            pdfs = functions.get_pdf_by_filters(session, *self._filters)
+        if not self.isInterruptionRequested():
+            paths = functions.existing_paths(session, pdfs, self._roots, self.isInterruptionRequested)
+            if paths is not None:
+                self.resultReady.emit(self._generation, paths)
+        session.close()
+
+
 class FilterFrame(QtWidgets.QFrame):
     filterChanged = QtCore.Signal(list)
+    DELAY = 250
 
     def __init__(self, session_maker):
         super().__init__(parent=None)
+        self._session_maker = session_maker
         self._session = session_maker()
+        self._roots: tuple[str, ...] = tuple()
+        self._generation = 0
+        self._threads: set[QueryThread] = set()
 
         self._pub = CheckGroup("发布")
         self._rls = CheckGroup("年份")
@@ -165,6 +192,10 @@ class FilterFrame(QtWidgets.QFrame):
         self._kw.setPlaceholderText("输入过滤关键词，以空格分隔")
         self._btn = QtWidgets.QPushButton("导出当前列表")
         self._btn.setObjectName("PushButton")
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FilterFrame.DELAY)
+        self._timer.timeout.connect(self._query)
 
         self.setLayout(QtWidgets.QVBoxLayout())
         self.layout().setSpacing(0)
@@ -181,31 +212,46 @@ class FilterFrame(QtWidgets.QFrame):
         self._kw.textChanged.connect(self.keyword_changed)
 
     def check_changed(self):
+        self._timer.stop()
+        self._query(keywords=list())
+
+    def keyword_changed(self):
+        # 输入停顿后才查询，避免每个字符都查询一次
+        self._timer.start()
+
+    def _query(self, keywords: list[str] | None = None):
+        # 每次查询都在独立线程中进行，只发布最新一次查询的结果
+        if keywords is None:
+            keywords = self._kw.text().split()
         pub = self._pub.selected
         rls = list(map(int, self._rls.selected))
         tag = self._tag.selected
-        pdfs = functions.get_pdf_by_filters(self._session, pub, rls, tag)
-        paths = []
-        for pdf in pdfs:
-            if os.path.exists(pdf.fp):
-                paths.append(pdf.fp)
-            else:
-                functions.delete_pdf(self._session, pdf)
-        self.filterChanged.emit(paths)
-
-    def keyword_changed(self):
-        keywords = self._kw.text().split()
-        if not keywords:
-            self.check_changed()
-            return
-        pdfs = functions.get_pdf_by_keywords(self._session, keywords)
-        paths = []
-        for pdf in pdfs:
-            if os.path.exists(pdf.fp):
-                paths.append(pdf.fp)
-            else:
-                functions.delete_pdf(self._session, pdf)
-        self.filterChanged.emit(paths)
+        for thread in self._threads:
+            thread.requestInterruption()
+        self._generation += 1
+        thread = QueryThread(self._generation, keywords, (pub, rls, tag), self._roots, self._session_maker)
+        thread.resultReady.connect(self._publish)
+        thread.finished.connect(lambda: self._finish(thread))
+        self._threads.add(thread)
+        thread.start()
+
+    def _publish(self, generation: int, paths: list[str]):
+        if generation == self._generation:
+            self.filterChanged.emit(paths)
+
+    def _finish(self, thread: QueryThread):
+        self._threads.discard(thread)
+        thread.deleteLater()
+
+    def stop(self):
+        self._timer.stop()
+        for thread in list(self._threads):
+            thread.requestInterruption()
+            thread.wait()
+
+    def set_roots(self, roots: list[str]):
+        # 处于监视中的路径由FolderWatcher同步数据库，无需逐个检查文件是否存在
+        self._roots = tuple(f"{root}/" for root in roots)
 
     def refresh(self):
         self._pub.set_checks(functions.get_all_pub(self._session))
@@ -0,0 +1,138 @@
+from collections.abc import Callable
+
+from PySide6 import QtCore
+from sqlalchemy.orm import Session
+
+from core import functions
+
+
+class WatchThread(QtCore.QThread):
+    pathsAdded = QtCore.Signal(list)
+    pathsRemoved = QtCore.Signal(list)
+    pathsMoved = QtCore.Signal(dict)
+    dirsChanged = QtCore.Signal(list, list)
+
+    def __init__(self, index: dict, dirs: list[str], roots: list[str], session_maker: Callable[[], Session]):
+        super().__init__(parent=None)
+        self._index = index
+        self._dirs = dirs
+        self._roots = roots
+        self._session_maker = session_maker
+
+    def run(self) -> None:
+        session = self._session_maker()
+        entries = functions.rescan_dirs(self._index, self._dirs, self._roots)
+        added, removed, created, gone = functions.update_scan_index(session, self._index, entries)
+        moved = functions.sync_pdf_paths(session, added, removed)
+        session.close()
+        if created or gone:
+            self.dirsChanged.emit(created, gone)
+        if moved:
+            self.pathsMoved.emit(moved)
+        if removed := [path for path in removed if path not in moved]:
+            self.pathsRemoved.emit(removed)
+        if added := [path for path in added if path not in moved.values()]:
+            self.pathsAdded.emit(added)
+
+
+class FolderWatcher(QtCore.QObject):
+    pathsAdded = QtCore.Signal(list)
+    pathsRemoved = QtCore.Signal(list)
+    pathsMoved = QtCore.Signal(dict)
+    rootsChanged = QtCore.Signal(list)
+    DELAY = 500
+    MAX_WATCHES = 8192
+
+    def __init__(self, session_maker: Callable[[], Session]):
+        super().__init__(parent=None)
+        self._session_maker = session_maker
+        self._session = session_maker()
+        self._index: dict[str, tuple[int, str, str]] = dict()
+        self._roots: list[str] = list()
+        self._thread: WatchThread | None = None
+        self._pending_dirs: set[str] = set()
+        self._pending_roots: set[str] = set()
+
+        self._watcher = QtCore.QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._dir_changed)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FolderWatcher.DELAY)
+        self._timer.timeout.connect(self._sync)
+
+        # 启动时按索引增量检查一次，补上程序关闭期间的变化
+        self._roots = functions.get_all_root(self._session)
+        for root in self._roots:
+            self._load(root)
+        self._pending_roots.update(self._roots)
+        self._timer.start()
+
+    @property
+    def roots(self) -> list[str]:
+        # 只有全部子文件夹都处于监视中的路径才能跳过存在性检查
+        watched = set(self._watcher.directories())
+        return [r for r in self._roots if all(d in watched for d in self._index if d == r or d.startswith(f"{r}/"))]
+
+    def watch(self, folder: str) -> None:
+        if self._thread:
+            self._pending_roots.add(folder)
+            return
+        self._roots = functions.add_root(self._session, folder)
+        self._load(folder)
+
+    def _load(self, folder: str) -> None:
+        self._index.update(functions.load_scan_index(self._session, folder))
+        self._add_dirs([d for d in self._index if d == folder or d.startswith(f"{folder}/")])
+
+    def _add_dirs(self, dirs: list[str]) -> None:
+        watched = set(self._watcher.directories())
+        dirs = [d for d in dirs if d not in watched][: max(0, FolderWatcher.MAX_WATCHES - len(watched))]
+        if dirs:
+            self._watcher.addPaths(dirs)
+        self.rootsChanged.emit(self.roots)
+
+    def _remove_dirs(self, dirs: list[str]) -> None:
+        watched = set(self._watcher.directories())
+        if dirs := [d for d in dirs if d in watched]:
+            self._watcher.removePaths(dirs)
+
+    def _dir_changed(self, path: str) -> None:
+        self._pending_dirs.add(path)
+        self._timer.start()
+
+    def _sync(self) -> None:
+        if self._thread:
+            return
+        if not self._pending_dirs and not self._pending_roots:
+            return
+        roots = [r for r in self._pending_roots if r not in self._roots]
+        for root in roots:
+            self._roots = functions.add_root(self._session, root)
+            self._load(root)
+        roots = [r for r in self._pending_roots if r not in roots]
+        dirs = sorted(self._pending_dirs)
+        self._pending_dirs.clear()
+        self._pending_roots.clear()
+        self._thread = WatchThread(self._index, dirs, roots, self._session_maker)
+        self._thread.pathsAdded.connect(self.pathsAdded.emit)
+        self._thread.pathsRemoved.connect(self.pathsRemoved.emit)
+        self._thread.pathsMoved.connect(self.pathsMoved.emit)
+        self._thread.dirsChanged.connect(self._dirs_changed)
+        self._thread.finished.connect(self._finish)
+        self._thread.start()
+
+    def _dirs_changed(self, created: list[str], gone: list[str]) -> None:
+        self._remove_dirs(gone)
+        self._add_dirs(created)
+
+    def _finish(self) -> None:
+        if self._thread:
+            self._thread.deleteLater()
+        self._thread = None
+        if self._pending_dirs or self._pending_roots:
+            self._timer.start()
+
+    def stop(self) -> None:
+        self._timer.stop()
+        if self._thread:
+            self._thread.wait()
@@ -11,12 +11,18 @@ from ui.info_frame.year_spin import YearSpin
 class InfoFrame(QtWidgets.QFrame):
     infoChanged = QtCore.Signal()
 
-    def __init__(self, session_maker: Callable[[], Session]):
+    def __init__(self, session_maker: Callable[[], Session], cleanup_delay: int = 0):
         super().__init__(parent=None)
         self.setObjectName("InfoFrame")
         self._session = session_maker()
         self._path = ""
 
+        # 设置了延迟时，停止编辑一段时间后再清理未使用的发布和标签
+        self._cleanup = QtCore.QTimer(self)
+        self._cleanup.setSingleShot(True)
+        self._cleanup.setInterval(cleanup_delay)
+        self._cleanup.timeout.connect(self._clear_unused)
+
         self._tags = TagEdit()
         self._tit = self._create_line("tit")
         self._num = self._create_line("num")
@@ -66,42 +72,49 @@ class InfoFrame(QtWidgets.QFrame):
     def _set_info(self, info: dict):
         self._tit.setText(info.get("tit", ""))
         self._num.setText(info.get("num", ""))
-        self._pubs.tags = [p.pub for p in info.get("pubs", list())]
+        self._pubs.tags = info.get("pubs", list())
         self._rls.setValue(info.get("rls", None))
-        self._tags.tags = [t.tag for t in info.get("tags", list())]
+        self._tags.tags = info.get("tags", list())
 
     def _change_info(self, field: str | None = None) -> None:
-        pdf = functions.get_pdf_by_path(self._session, self._path)
         if not isinstance(field, str):
             sender = self.sender()
             if not sender or not sender.property("field"):
                 return
             field = sender.property("field")
         assert field is not None
-        if self._tit.text().strip():
-            if not pdf:
-                pdf = functions.create_pdf_by_path(self._session, self._path)
-            data = self._get_info().get(field)
-            if field in ("tit", "num", "rls"):
-                tit_kw = functions.gen_keywords(self._get_info().get("tit", ""))
-                num_kw = functions.gen_keywords(self._get_info().get("num", ""))
-                rls_kw = functions.gen_keywords(str(self._get_info().get("rls", "")))
-                keyword = f"{tit_kw}|{num_kw}|{rls_kw}"
-                keyword = keyword.replace("||", "|")
-                keyword = keyword.strip("|")
-                functions.update_pdf_with_field(self._session, pdf, field, data, kw=keyword)
+        # 一次编辑的全部改动在同一个事务中提交
+        with functions.unit_of_work(self._session):
+            pdf = functions.get_pdf_by_path(self._session, self._path)
+            if self._tit.text().strip():
+                if not pdf:
+                    pdf = functions.create_pdf_by_path(self._session, self._path)
+                info = self._get_info()
+                data = info.get(field)
+                if field in ("tit", "num", "rls"):
+                    keyword = functions.gen_pdf_keywords(info["tit"], info["num"], info["rls"])
+                    functions.update_pdf_with_field(self._session, pdf, field, data, kw=keyword)
+                else:
+                    functions.update_pdf_with_field(self._session, pdf, field, data)
+            elif pdf and field == "tit":
+                functions.delete_pdf(self._session, pdf)
+                self.clear()
             else:
-                functions.update_pdf_with_field(self._session, pdf, field, data)
-        elif pdf and field == "tit":
-            functions.delete_pdf(self._session, pdf)
-            self.clear()
-        else:
-            return
-        functions.clear_pub_if_unused(self._session)
-        functions.clear_tag_if_unused(self._session)
+                return
+            if not self._cleanup.interval():
+                functions.clear_pub_if_unused(self._session)
+                functions.clear_tag_if_unused(self._session)
+        if self._cleanup.interval():
+            self._cleanup.start()
         self.infoChanged.emit()
         self._reset_completer()
 
+    def _clear_unused(self) -> None:
+        with functions.unit_of_work(self._session):
+            functions.clear_pub_if_unused(self._session)
+            functions.clear_tag_if_unused(self._session)
+        self._reset_completer()
+
     def _reset_completer(self):
         self._tags.set_completer(functions.get_all_tag(self._session))
         self._pubs.set_completer(functions.get_all_pub(self._session))
@@ -112,8 +125,8 @@ class InfoFrame(QtWidgets.QFrame):
             self.clear()
             return self.setEnabled(False)
         self.setEnabled(True)
-        if pdf := functions.get_pdf_by_path(self._session, self._path):
-            info = {k: getattr(pdf, k) for k in ("tit", "num", "pubs", "rls", "tags")}
+        if row := functions.get_pdf_rows_by_paths(self._session, [self._path]).get(self._path):
+            info = dict(zip(("tit", "num", "pubs", "rls", "tags"), row))
             self._rls.valueChanged.disconnect()
             self._pubs.tagChanged.disconnect()
             self._tags.tagChanged.disconnect()
@@ -1,18 +1,44 @@
 import os
+import time
 
 from PySide6 import QtWidgets, QtCore, QtGui
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from core import functions, model
-from ui import ScanFrame, FilterFrame, PathFrame, PreviewFrame, InfoFrame
+from core import database, exporter, functions
+from ui import ScanFrame, FilterFrame, PathFrame, PreviewFrame, InfoFrame, FolderWatcher, ExportDialog
+
+
+class FingerprintThread(QtCore.QThread):
+    def __init__(self, session_maker):
+        super().__init__(parent=None)
+        self._session_maker = session_maker
+
+    def run(self) -> None:
+        session = self._session_maker()
+        functions.fill_fingerprints(session, cancelled=self.isInterruptionRequested)
+        session.close()
+
+
+class ReindexThread(QtCore.QThread):
+    progressChanged = QtCore.Signal(int, int, float)
+
+    def __init__(self, session_maker):
+        super().__init__(parent=None)
+        self._session_maker = session_maker
+
+    def run(self) -> None:
+        session = self._session_maker()
+        start = time.perf_counter()
+        for done, total in functions.reindex_keywords(session, cancelled=self.isInterruptionRequested):
+            self.progressChanged.emit(done, total, time.perf_counter() - start)
+        session.close()
+
 
 class MainWindow(QtWidgets.QSplitter):
     def __init__(self):
         super().__init__()
-        engine = create_engine("sqlite:///pdf.db3", echo=False)
-        model.Base.metadata.create_all(engine)
-        self.sessionmaker = sessionmaker(bind=engine)
+        self.settings = database.load_settings()
+        self.sessionmaker = sessionmaker(bind=database.create_database(self.settings))
 
         self.setWindowTitle("TagPDF v1.8.0")
         self.setObjectName("MainWindow")
@@ -20,15 +46,16 @@ class MainWindow(QtWidgets.QSplitter):
         self.setHandleWidth(1)
         self.setMinimumSize(1440, 720)
 
-        scan_frame = ScanFrame(root="/")
+        self.scan_frame = ScanFrame(root="/", session_maker=self.sessionmaker)
         self.filter_frame = FilterFrame(session_maker=self.sessionmaker)
         self.path_frame = PathFrame(session_maker=self.sessionmaker)
         preview_frame = PreviewFrame()
-        info_frame = InfoFrame(session_maker=self.sessionmaker)
+        info_frame = InfoFrame(session_maker=self.sessionmaker, cleanup_delay=self.settings.getint("cleanup", "delay"))
+        self.watcher = FolderWatcher(session_maker=self.sessionmaker)
 
         left_frame = QtWidgets.QTabWidget()
         left_frame.addTab(self.filter_frame, "过滤查询")
-        left_frame.addTab(scan_frame, "扫描添加")
+        left_frame.addTab(self.scan_frame, "扫描添加")
 
         right_frame = QtWidgets.QSplitter()
         right_frame.setOrientation(QtCore.Qt.Orientation.Vertical)
@@ -45,30 +72,99 @@ class MainWindow(QtWidgets.QSplitter):
         self.setStretchFactor(1, 9)
         self.setStretchFactor(2, 4)
 
-        scan_frame.folderChanged.connect(self.path_frame.set_paths)
+        self.scan_frame.folderChanged.connect(self.path_frame.set_paths)
+        self.scan_frame.pathsFound.connect(self.path_frame.add_found)
         self.filter_frame.filterChanged.connect(self.path_frame.set_paths)
         self.path_frame.selectChanged.connect(preview_frame.set_path)
         self.path_frame.selectChanged.connect(info_frame.set_path)
         info_frame.infoChanged.connect(self.path_frame.refresh)
         info_frame.infoChanged.connect(self.filter_frame.refresh)
-        scan_frame._btn.clicked.connect(self.filter_frame.refresh)
+        self.scan_frame.scanFinished.connect(self.filter_frame.refresh)
+        self.scan_frame.scanFinished.connect(self.path_frame.resort)
+        self.scan_frame.folderScanned.connect(self.watcher.watch)
+        self.watcher.rootsChanged.connect(self.filter_frame.set_roots)
+        self.watcher.pathsAdded.connect(self.path_frame.insert_paths)
+        self.watcher.pathsRemoved.connect(self.path_frame.remove_paths)
+        self.watcher.pathsMoved.connect(self.path_frame.move_paths)
         self.filter_frame._btn.clicked.connect(self.export)
 
+        self.filter_frame.set_roots(self.watcher.roots)
         self.filter_frame.refresh()
         self.filter_frame.check_changed()
 
+        self._fingerprint = FingerprintThread(self.sessionmaker)
+        self._fingerprint.start()
+
     def export(self):
         if not (paths := self.path_frame._model._paths):
             return
         if f := QtWidgets.QFileDialog.getExistingDirectory(self, "选择导出路径", f"C:/Users/{os.getlogin()}/Desktop"):
-            session = self.sessionmaker()
-            functions.zip_path(paths, f, session)
-            session.close()
+            try:
+                options = exporter.export_options(self.settings["export"])
+            except ValueError as e:
+                QtWidgets.QMessageBox.critical(self, "错误", str(e))
+                return
+            # 逐个询问文件夹中每一批未完成的导出，放弃的删除，选择继续的依次续传，都放弃时才重新导出
+            resumes = list()
+            for journals in reversed(exporter.find_journals(f)):
+                box = QtWidgets.QMessageBox(self)
+                box.setWindowTitle("继续导出")
+                name = os.path.basename(journals[0]).removesuffix(exporter.JOURNAL)
+                if len(journals) > 1:
+                    name += f"等{len(journals)}个分卷"
+                box.setText(f"发现未完成的导出{name}，是否从中断处继续？")
+                box.setStandardButtons(QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
+                box.setButtonText(QtWidgets.QMessageBox.StandardButton.Yes, "继续")
+                box.setButtonText(QtWidgets.QMessageBox.StandardButton.No, "放弃")
+                if box.exec() == QtWidgets.QMessageBox.StandardButton.Yes:
+                    resumes.append(journals)
+                else:
+                    exporter.discard_journals(journals)
+            for journals in resumes:
+                ExportDialog(list(paths), f, self.sessionmaker, options, journals, self).exec()
+            if not resumes:
+                ExportDialog(list(paths), f, self.sessionmaker, options, None, self).exec()
+
+    def reindex(self):
+        box = QtWidgets.QMessageBox(self)
+        box.setWindowTitle("重建关键字")
+        box.setText("是否重新生成全部关键字？")
+        box.setStandardButtons(QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
+        box.setButtonText(QtWidgets.QMessageBox.StandardButton.Yes, "确定")
+        box.setButtonText(QtWidgets.QMessageBox.StandardButton.No, "放弃")
+        if box.exec() != QtWidgets.QMessageBox.StandardButton.Yes:
+            return
+        dialog = QtWidgets.QProgressDialog("正在读取数据库……", "停止", 0, 0, self)
+        dialog.setWindowTitle("重建关键字")
+        dialog.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        dialog.setMinimumDuration(0)
+        thread = ReindexThread(self.sessionmaker)
+
+        def progress(done: int, total: int, elapsed: float) -> None:
+            dialog.setMaximum(total)
+            dialog.setValue(done)
+            dialog.setLabelText(f"已更新 {done}/{total} 条，每秒 {done / elapsed if elapsed else 0:.0f} 条")
+
+        thread.progressChanged.connect(progress)
+        dialog.canceled.connect(thread.requestInterruption)
+        thread.finished.connect(dialog.reset)
+        thread.finished.connect(thread.deleteLater)
+        thread.finished.connect(self.filter_frame.check_changed)
+        thread.start()
+        dialog.exec()
+        thread.wait()
 
     def closeEvent(self, event: QtCore.QEvent):
+        self.scan_frame.stop()
+        self.watcher.stop()
+        self.filter_frame.stop()
+        self._fingerprint.requestInterruption()
+        self._fingerprint.wait()
         session = self.sessionmaker()
-        functions.clear_pub_if_unused(session)
-        functions.clear_tag_if_unused(session)
+        with functions.unit_of_work(session):
+            functions.purge_lost_pdf(session)
+            functions.clear_pub_if_unused(session)
+            functions.clear_tag_if_unused(session)
         session.close()
         event.accept()
 
@@ -87,4 +183,6 @@ class MainWindow(QtWidgets.QSplitter):
                 else:
                     self.filter_frame.check_changed()
                 session.close()
+        if event.key() == QtCore.Qt.Key.Key_R and event.modifiers() == QtCore.Qt.KeyboardModifier.ControlModifier:
+            self.reindex()
         return super().keyPressEvent(event)
@@ -1,5 +1,6 @@
 import os
 from typing import Any
+from collections import OrderedDict
 from collections.abc import Callable
 
 from PySide6 import QtCore, QtGui, QtWidgets
@@ -11,25 +12,114 @@ from core import functions
 
 
 class PathModel(QtCore.QAbstractTableModel):
+    PAGE = 256
+    CACHE = 64
+
     def __init__(self, session_maker: Callable[[], Session]):
         super().__init__(parent=None)
         self._session = session_maker()
         self._paths: list[str] = list()
+        self._origin: list[str] = list()
+        # 当前的表头排序(列, 顺序)，列表更新后按它重新排序，None为加入列表时的顺序
+        self._sort: tuple[int, QtCore.Qt.SortOrder] | None = None
         self._columns = {"文件名": "name", "标题": "tit", "文号": "num"}
-        self._data: list[list[str]] = list()
+        # 只向视图暴露已经加载的行，行数据按页读取，并只保留最近使用的若干页
+        self._loaded = 0
+        self._pages: OrderedDict[int, list[list[str]]] = OrderedDict()
 
     def set_paths(self, paths: list[str]) -> None:
-        self._paths = paths
-        self.refresh()
+        self.beginResetModel()
+        self._origin = list(paths)
+        self._paths = self._sorted()
+        self._loaded = min(len(self._paths), PathModel.PAGE)
+        self._pages.clear()
+        self.endResetModel()
+
+    def add_paths(self, paths: list[str]) -> None:
+        self._paths.extend(paths)
+        self._origin.extend(paths)
+        if self._loaded < PathModel.PAGE:
+            self.fetchMore()
+
+    def remove_paths(self, paths: list[str]) -> None:
+        removed = set(paths)
+        self._origin = [path for path in self._origin if path not in removed]
+        for row in reversed([i for i, path in enumerate(self._paths) if path in removed]):
+            if row < self._loaded:
+                self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                del self._paths[row]
+                self._loaded -= 1
+                self._pages.clear()
+                self.endRemoveRows()
+            else:
+                del self._paths[row]
+
+    def move_paths(self, moved: dict[str, str]) -> None:
+        self._origin = [moved.get(path, path) for path in self._origin]
+        for row, path in enumerate(self._paths):
+            if path in moved:
+                self._paths[row] = moved[path]
+                self._pages.pop(row // PathModel.PAGE, None)
+                if row < self._loaded:
+                    self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def _sorted(self) -> list[str]:
+        if not self._sort or not self._origin:
+            return list(self._origin)
+        column, order = self._sort
+        field = list(self._columns.values())[column]
+        return functions.sort_paths(self._session, self._origin, field, order == QtCore.Qt.SortOrder.DescendingOrder)
+
+    def sort(self, column: int, order: QtCore.Qt.SortOrder = QtCore.Qt.SortOrder.AscendingOrder) -> None:
+        # 由数据库完成排序，column为-1时恢复加入列表时的顺序
+        self._sort = (column, order) if column >= 0 else None
+        if not self._origin:
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        selected = [self._paths[index.row()] for index in persistent]
+        self._paths = self._sorted()
+        self._pages.clear()
+        if persistent:
+            rows = {path: row for row, path in enumerate(self._paths) if path in selected}
+            indexes = [
+                self.index(rows[path], index.column()) if rows[path] < self._loaded else QtCore.QModelIndex()
+                for path, index in zip(selected, persistent)
+            ]
+            self.changePersistentIndexList(persistent, indexes)
+        self.layoutChanged.emit()
+
+    def resort(self) -> None:
+        # 扫描等分批加入的路径先追加在末尾，全部加入后再按当前排序整理一次
+        if self._sort:
+            self.sort(*self._sort)
+
+    def canFetchMore(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> bool:
+        return self._loaded < len(self._paths)
+
+    def fetchMore(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> None:
+        count = min(len(self._paths) - self._loaded, PathModel.PAGE)
+        if count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def _row(self, row: int) -> list[str]:
+        page = row // PathModel.PAGE
+        if page in self._pages:
+            self._pages.move_to_end(page)
+        else:
+            paths = self._paths[page * PathModel.PAGE : (page + 1) * PathModel.PAGE]
+            info = functions.get_pdf_info_by_paths(self._session, paths)
+            self._pages[page] = [[os.path.basename(path), *info.get(path, ("", ""))] for path in paths]
+            if len(self._pages) > PathModel.CACHE:
+                self._pages.popitem(last=False)
+        return self._pages[page][row % PathModel.PAGE]
 
     def refresh(self):
         self.beginResetModel()
-        self._data = list()
-        for path in self._paths:
-            if pdf := functions.get_pdf_by_path(self._session, path):
-                self._data.append([getattr(pdf, v) for v in self._columns.values()])
-            else:
-                self._data.append([os.path.basename(path), "", ""])
+        self._pages.clear()
         self.endResetModel()
 
     def headerData(self, section: int, orientation: QtCore.Qt.Orientation, role: QtCore.Qt.ItemDataRole = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
@@ -40,19 +130,19 @@ class PathModel(QtCore.QAbstractTableModel):
                 return f"{section+1} "
 
     def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
-        return len(self._paths)
+        return self._loaded
 
     def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
         return len(self._columns)
 
     def data(self, index: QtCore.QModelIndex, role: QtCore.Qt.ItemDataRole = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
         if role == QtCore.Qt.ItemDataRole.DisplayRole:
-            return self._data[index.row()][index.column()]
+            return self._row(index.row())[index.column()]
         if role == QtCore.Qt.ItemDataRole.BackgroundRole:
-            if self._data[index.row()][1]:
+            if self._row(index.row())[1]:
                 return QtGui.QBrush(QtCore.Qt.GlobalColor.cyan)
         if role == QtCore.Qt.ItemDataRole.FontRole and index.column() == 0:
-            if self._data[index.row()][1]:
+            if self._row(index.row())[1]:
                 font = QtGui.QFont()
                 font.setBold(True)
                 return font
@@ -89,12 +179,11 @@ class PathFrame(QtWidgets.QTableView):
     def __init__(self, session_maker: Callable[[], Session]):
         super().__init__(parent=None)
         self.setObjectName("PathFrame")
-        self.setSortingEnabled(True)
+        self._folder = ""
 
         self._model = PathModel(session_maker=session_maker)
-        self._proxy = QtCore.QSortFilterProxyModel()
-        self._proxy.setSourceModel(self._model)
-        self.setModel(self._proxy)
+        self.setModel(self._model)
+        self.setSortingEnabled(True)
 
         self.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
         self.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
@@ -112,7 +201,7 @@ class PathFrame(QtWidgets.QTableView):
 
         self.corner_button = CornerButton(self)
         self.setCornerWidget(self.corner_button)
-        self.corner_button.clicked.connect(lambda: self._proxy.sort(-1))
+        self.corner_button.clicked.connect(lambda: self._model.sort(-1))
         self.corner_button.setToolTip("恢复默认排序")
 
     def setCornerWidget(self, widget):
@@ -129,14 +218,41 @@ class PathFrame(QtWidgets.QTableView):
         self.corner_button.setGeometry(self.cornerButtonRect())
 
     def select(self, index: QtCore.QModelIndex):
-        index = self._proxy.mapToSource(index)
         self.selectChanged.emit(self._model._paths[index.row()])
 
-    def set_paths(self, paths: list[str]):
+    def set_paths(self, paths: list[str], folder: str = ""):
+        self._folder = folder
         self.setCurrentIndex(QtCore.QModelIndex())
         self._model.set_paths(paths)
         self.selectChanged.emit("")
 
+    def add_paths(self, paths: list[str]):
+        if paths:
+            self._model.add_paths(paths)
+
+    def resort(self):
+        self._model.resort()
+
+    def add_found(self, paths: list[str], folder: str):
+        # 扫描过程中列表被过滤结果替换后，不再把该次扫描的结果加入列表
+        if folder == self._folder:
+            self.add_paths(paths)
+
+    def insert_paths(self, paths: list[str]):
+        # 只有当前列表来自扫描时，才把监视到的新PDF加入列表
+        if not self._folder:
+            return
+        exists = set(self._model._paths)
+        if added := [p for p in paths if p.startswith(f"{self._folder}/") and p not in exists]:
+            self.add_paths(added)
+            self.resort()
+
+    def remove_paths(self, paths: list[str]):
+        self._model.remove_paths(paths)
+
+    def move_paths(self, moved: dict[str, str]):
+        self._model.move_paths(moved)
+
     def mousePressEvent(self, event: QMouseEvent) -> None:
         # 判断mouse点击的位置是否在表格内，如果不在，则清空选择
         if not self.indexAt(event.pos()).isValid():
@@ -1,6 +1,9 @@
+import time
 from typing import cast
+from collections.abc import Callable
 
 from PySide6 import QtWidgets, QtCore
+from sqlalchemy.orm import Session
 
 from core import functions
 
@@ -30,12 +33,59 @@ class ProxyModel(QtCore.QSortFilterProxyModel):
         return left_model.filePath(source_left) < left_model.filePath(source_right)
 
 
+class ScanThread(QtCore.QThread):
+    pathsFound = QtCore.Signal(list, str)
+    progressChanged = QtCore.Signal(int, int, float)
+    INTERVAL = 0.1
+
+    def __init__(self, folder: str, session_maker: Callable[[], Session]):
+        super().__init__(parent=None)
+        self._folder = folder
+        self._session_maker = session_maker
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        last = 0.0
+        dirs, found = 0, 0
+        batch: list[str] = list()
+        session = self._session_maker()
+        index = functions.load_scan_index(session, self._folder)
+        entries = dict()
+        for root, paths, entry in functions.iter_pdf(self._folder, index=index):
+            if self.isInterruptionRequested():
+                break
+            dirs += 1
+            if entry:
+                entries[root] = entry
+            batch.extend(paths)
+            if (now := time.perf_counter()) - last < ScanThread.INTERVAL:
+                continue
+            last = now
+            if batch:
+                found += len(batch)
+                self.pathsFound.emit(batch, self._folder)
+                batch = list()
+            self.progressChanged.emit(dirs, found, now - start)
+        if batch:
+            found += len(batch)
+            self.pathsFound.emit(batch, self._folder)
+        self.progressChanged.emit(dirs, found, time.perf_counter() - start)
+        added, removed, created, gone = functions.update_scan_index(session, index, entries)
+        functions.sync_pdf_paths(session, added, removed)
+        session.close()
+
+
 class ScanFrame(QtWidgets.QFrame):
-    folderChanged = QtCore.Signal(list)
+    folderChanged = QtCore.Signal(list, str)
+    # 每批结果都带上扫描的文件夹，列表已经换成别的内容时由接收方丢弃
+    pathsFound = QtCore.Signal(list, str)
+    scanFinished = QtCore.Signal()
+    folderScanned = QtCore.Signal(str)
 
-    def __init__(self, root):
+    def __init__(self, root, session_maker: Callable[[], Session]):
         super().__init__(parent=None)
         self.setObjectName("ScanFrame")
+        self._session_maker = session_maker
 
         self._model = QtWidgets.QFileSystemModel()
         self._model.setRootPath(root)
@@ -58,14 +108,48 @@ class ScanFrame(QtWidgets.QFrame):
         self._btn.setObjectName("PushButton")
         self._btn.clicked.connect(self._scan)
 
+        self._progress = QtWidgets.QLabel()
+        self._progress.setContentsMargins(5, 3, 5, 3)
+        self._thread: ScanThread | None = None
+
         self.setLayout(QtWidgets.QVBoxLayout())
         self.layout().setContentsMargins(0, 0, 0, 3)
         self.layout().setSpacing(0)
         self.layout().addWidget(self._tree)
+        self.layout().addWidget(self._progress)
         self.layout().addWidget(self._btn)
 
     def _scan(self) -> None:
+        if self._thread:
+            self._thread.requestInterruption()
+            return
         index = self._proxy.mapToSource(self._tree.currentIndex())
         folder = self._model.filePath(index)
-        paths = functions.scan_pdf(folder)
-        self.folderChanged.emit(paths)
+        if not folder or functions.is_disk_root(folder):
+            self._progress.setText("请选择磁盘根目录以外的文件夹")
+            return
+        self.folderChanged.emit(list(), folder)
+        self._thread = ScanThread(folder, self._session_maker)
+        self._thread.pathsFound.connect(self.pathsFound.emit)
+        self._thread.progressChanged.connect(self._show_progress)
+        self._thread.finished.connect(self._finish)
+        self._btn.setText("停止扫描")
+        self._progress.setText("正在扫描…")
+        self._thread.start()
+
+    def _show_progress(self, dirs: int, found: int, elapsed: float) -> None:
+        self._progress.setText(f"文件夹 {dirs}，PDF {found}，用时 {elapsed:.1f} 秒")
+
+    def _finish(self) -> None:
+        if self._thread:
+            if not self._thread.isInterruptionRequested():
+                self.folderScanned.emit(self._thread._folder)
+            self._thread.deleteLater()
+        self._thread = None
+        self._btn.setText("扫描选中路径")
+        self.scanFinished.emit()
+
+    def stop(self) -> None:
+        if self._thread:
+            self._thread.requestInterruption()
+            self._thread.wait()
@@ -0,0 +1,100 @@
+import os
+import zipfile
+
+import pytest
+from sqlalchemy.orm import Session
+
+from core import database, exporter, functions
+
+
+@pytest.fixture
+def session(tmp_path):
+    config = database.load_settings(str(tmp_path / "settings.ini"))
+    config["database"]["path"] = str(tmp_path / "pdf.db3")
+    engine = database.create_database(config)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def make_pdfs(session, folder, count, size, name=lambda i: f"{i}.pdf"):
+    paths = list()
+    with functions.unit_of_work(session):
+        for i in range(count):
+            path = os.path.join(folder, name(i))
+            with open(path, "wb") as f:
+                f.write(os.urandom(size))
+            pdf = functions.create_pdf_by_path(session, path)
+            pdf.tit, pdf.rls = f"标题{i}", 2000 + i % 3
+            paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("compression", ["stored", "parallel"])
+def test_volumes_stay_under_cap(session, tmp_path, compression):
+    source, out = tmp_path / "source", tmp_path / "out"
+    source.mkdir()
+    out.mkdir()
+    # 文件很小而文件名很长，分卷大小主要由文件头和目录决定
+    paths = make_pdfs(session, source, 200, 10, lambda i: f"{'关于进一步加强某某工作的通知' * 5}第{i}号附件.pdf")
+    zip_file_path, csv_path = exporter.export_names(str(out))
+    cap = 20000
+    for _ in exporter.zip_path(paths, zip_file_path, csv_path, session, compression, workers=2, volume_size=cap):
+        pass
+    volumes = sorted(out.glob("PDF_*.zip"))
+    assert len(volumes) > 1
+    names = list()
+    for volume in volumes:
+        assert os.path.getsize(volume) <= cap
+        with zipfile.ZipFile(volume) as zip_file:
+            assert zip_file.testzip() is None
+            names.extend(zip_file.namelist())
+    assert len(names) == len(paths)
+
+
+def test_parallel_archive_is_valid(session, tmp_path):
+    source, out = tmp_path / "source", tmp_path / "out"
+    source.mkdir()
+    out.mkdir()
+    paths = make_pdfs(session, source, 6, 300000)
+    # 可压缩的文件走压缩后写入的路径，随机数据走直接存储的路径
+    with open(paths[0], "wb") as f:
+        f.write(b"BT /F1 12 Tf (text) Tj ET\n" * 20000)
+    zip_file_path, csv_path = exporter.export_names(str(out))
+    for _ in exporter.zip_path(paths, zip_file_path, csv_path, session, "parallel", workers=2):
+        pass
+    with zipfile.ZipFile(zip_file_path) as zip_file:
+        assert zip_file.testzip() is None
+        types = {info.compress_type for info in zip_file.infolist()}
+        assert types == {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED}
+        for i, path in enumerate(paths):
+            with open(path, "rb") as f:
+                assert zip_file.read(f"{2000 + i % 3}/{i}.pdf") == f.read()
+
+
+@pytest.mark.parametrize("option, value", [("level", "12"), ("workers", "-2"), ("volume_size", "-1")])
+def test_export_options_rejects_bad_values(tmp_path, option, value):
+    config = database.load_settings(str(tmp_path / "settings.ini"))
+    config["export"][option] = value
+    with pytest.raises(ValueError):
+        exporter.export_options(config["export"])
+
+
+def test_parallel_volumes_share_one_pool(session, tmp_path, monkeypatch):
+    source, out = tmp_path / "source", tmp_path / "out"
+    source.mkdir()
+    out.mkdir()
+    paths = make_pdfs(session, source, 12, 20000)
+    pools = list()
+
+    class Pool(exporter.ProcessPoolExecutor):
+        def __init__(self, max_workers):
+            pools.append(max_workers)
+            super().__init__(max_workers=max_workers)
+
+    monkeypatch.setattr(exporter, "ProcessPoolExecutor", Pool)
+    zip_file_path, csv_path = exporter.export_names(str(out))
+    for _ in exporter.zip_path(paths, zip_file_path, csv_path, session, "parallel", workers=2, volume_size=50000):
+        pass
+    assert len(list(out.glob("PDF_*.zip"))) > 2
+    assert pools == [2]